@@ -0,0 +1,186 @@
+"""Admission control and load shedding for the scrape endpoints.
+
+At most ADMISSION_MAX_IN_FLIGHT requests run the pipeline at once and at
+most ADMISSION_MAX_QUEUED wait for a turn; anything beyond that is refused
+straight away with a Retry-After hint instead of queueing until the client
+times out. Work whose client disconnects is cancelled, queued or not.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "64"))
+ADMISSION_MAX_QUEUED = int(os.getenv("ADMISSION_MAX_QUEUED", "128"))
+# Longest a request waits for a turn before it is shed
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+
+
+class Overloaded(Exception):
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+class AdmissionController:
+    """Bounded in-flight count with a bounded FIFO queue in front of it."""
+
+    def __init__(
+        self,
+        max_in_flight: int = ADMISSION_MAX_IN_FLIGHT,
+        max_queued: int = ADMISSION_MAX_QUEUED,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.abandoned = 0
+        # Moving average of how long an admitted request holds its slot
+        self.service_seconds = 1.0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue should have drained."""
+        return max(1, math.ceil(self.service_seconds * (self.queued + 1) / self.max_in_flight))
+
+    async def acquire(self, timeout: float | None = None):
+        """Takes an in-flight slot, queueing for one if needed; pair with release().
+
+        Waits at most `queue_timeout`, or `timeout` if that is shorter (e.g.
+        what is left of the request's deadline). Raises Overloaded when the
+        queue is full or the wait times out.
+        """
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+        if self.queued >= self.max_queued:
+            self.rejected += 1
+            raise Overloaded("Server is overloaded, try again later", self.retry_after())
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._waiters.append(future)
+        # A timer rather than asyncio.wait_for, which can swallow a cancellation
+        # that races with the slot being handed over
+        wait = self.queue_timeout if timeout is None else min(self.queue_timeout, timeout)
+        timer = loop.call_later(wait, self._expire, future)
+        try:
+            await future
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise Overloaded("Timed out waiting for a free slot, try again later", self.retry_after())
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Handed a slot in the same tick as the cancellation: pass it on
+                self.release()
+            else:
+                self.abandoned += 1
+            raise
+        finally:
+            timer.cancel()
+            if future in self._waiters:
+                self._waiters.remove(future)
+
+    def _expire(self, future: asyncio.Future):
+        if not future.done():
+            future.set_exception(asyncio.TimeoutError())
+
+    def release(self):
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < self.max_in_flight:
+            future = self._waiters.popleft()
+            if not future.done():
+                self.in_flight += 1
+                self.admitted += 1
+                future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, timeout: float | None = None):
+        await self.acquire(timeout)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.service_seconds = 0.9 * self.service_seconds + 0.1 * (time.monotonic() - start)
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queued": self.max_queued,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "abandoned": self.abandoned,
+            "service_seconds": round(self.service_seconds, 3),
+        }
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """StreamingResponse that holds an admission slot until it has been sent.
+
+    The slot is released however sending ends, including a client that
+    disconnects before the body iterator is ever started.
+    """
+
+    def __init__(self, content, admission: AdmissionController, **kwargs):
+        super().__init__(content, **kwargs)
+        self.admission = admission
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.admission.release()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release()
+
+
+async def cancel_on_disconnect(request: Request, awaitable):
+    """Awaits `awaitable`, cancelling it if the client disconnects first.
+
+    Raises ClientDisconnected in that case. Only for requests whose body has
+    already been read (or that have none), since it consumes receive().
+    """
+    task = asyncio.ensure_future(awaitable)
+
+    async def watch():
+        while True:
+            message = await request.receive()
+            if message["type"] == "http.disconnect":
+                task.cancel()
+                return
+
+    watcher = asyncio.ensure_future(watch())
+    try:
+        return await task
+    except asyncio.CancelledError:
+        if watcher.done() and not watcher.cancelled():
+            raise ClientDisconnected()
+        raise
+    finally:
+        watcher.cancel()
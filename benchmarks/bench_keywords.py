@@ -0,0 +1,63 @@
+"""Offline throughput benchmark of the local keyword extractor.
+
+    python -m benchmarks.bench_keywords
+    python -m benchmarks.bench_keywords --documents 5000 --min-docs-per-sec 1000
+
+Scores the descriptions of the benchmark corpus plus generated listing-like
+descriptions one at a time, as the analysis does, and reports descriptions
+per second.
+"""
+import argparse
+import random
+import sys
+import time
+
+from benchmarks.fixtures import load_corpus
+from extractor import extract_app_data
+from keywords import extract_keywords
+
+_VOCABULARY = (
+    "habit tracker photo editor filters collage music player offline playlists budget planner expense "
+    "fitness workout timer meditation sleep sounds language learning flashcards vocabulary weather "
+    "forecast radar recipes cooking grocery list notes reminders calendar widgets backup sync dark mode"
+).split()
+_GLUE = "and the with your for to of in on your every all our".split()
+
+
+def generated_descriptions(count: int, words: int = 450, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    descriptions = []
+    for _ in range(count):
+        parts = []
+        for i in range(words):
+            parts.append(rng.choice(_GLUE) if i % 3 == 2 else rng.choice(_VOCABULARY))
+            if rng.random() < 0.08:
+                parts[-1] += "."
+        descriptions.append(" ".join(parts))
+    return descriptions
+
+
+def _rate(fn, count: int) -> float:
+    start = time.perf_counter()
+    fn()
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keyword extractor throughput benchmark")
+    parser.add_argument("--documents", type=int, default=2000, help="Generated descriptions to score")
+    parser.add_argument("--min-docs-per-sec", type=float, help="Exit non-zero if extraction is slower than this")
+    args = parser.parse_args()
+
+    corpus = [extract_app_data(page).get("Description", "") for page in load_corpus().values()]
+    texts = corpus + generated_descriptions(args.documents)
+    rate = _rate(lambda: [extract_keywords(text) for text in texts], len(texts))
+    print(f"descriptions: {len(texts)} ({len(corpus)} from the page corpus)")
+    print(f"throughput:   {rate:.0f} docs/s")
+    if args.min_docs_per_sec is not None and rate < args.min_docs_per_sec:
+        print(f"FAILED: {rate:.0f} < {args.min_docs_per_sec} docs/s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
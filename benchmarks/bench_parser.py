@@ -0,0 +1,151 @@
+"""Offline micro-benchmark of the listing extractor.
+
+    python -m benchmarks.bench_parser
+    python -m benchmarks.bench_parser --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench_parser --baseline benchmarks/baseline.json --max-regression 10
+
+For every page in the corpus it times the full extraction, the incremental
+extraction /scrape uses with PLAYSTORE_INCREMENTAL_FETCH (fed in
+FEED_CHUNK_SIZE chunks), the structured data scan, the DOM-only path and
+the DOM lookup of each field on its own, then traces the allocations of
+one full extraction. Peak RSS of the process is reported at the end. No
+network or OpenAI access is needed.
+"""
+import argparse
+import json
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.fixtures import FIXTURES_DIR, load_corpus
+from extractor import (
+    FEED_CHUNK_SIZE,
+    FIELD_SPECS,
+    IncrementalExtractor,
+    extract_app_data,
+    extract_dom_fields,
+    extract_structured_data,
+)
+
+
+def _incremental(page: bytes) -> dict:
+    extractor = IncrementalExtractor()
+    for start in range(0, len(page), FEED_CHUNK_SIZE):
+        extractor.feed(page[start:start + FEED_CHUNK_SIZE])
+        if extractor.complete:
+            break
+    else:
+        extractor.finish()
+    return extractor.result()
+
+
+def _stages(page: bytes) -> dict:
+    stages = {
+        "total": lambda: extract_app_data(page),
+        "incremental": lambda: _incremental(page),
+        "structured": lambda: extract_structured_data(page),
+        "dom": lambda: extract_dom_fields(page),
+    }
+    for spec in FIELD_SPECS:
+        stages[f"field:{spec.key}"] = lambda spec=spec: extract_dom_fields(page, (spec,))
+    return stages
+
+
+def _time(fn, repeat: int) -> dict:
+    fn()  # warm-up
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    p95 = statistics.quantiles(samples, n=20)[-1] if len(samples) > 1 else samples[0]
+    return {"median_ms": round(statistics.median(samples), 4), "p95_ms": round(p95, 4)}
+
+
+def _allocations(page: bytes) -> dict:
+    tracemalloc.start()
+    try:
+        extract_app_data(page)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"alloc_peak_kb": round(peak / 1024, 1), "alloc_retained_kb": round(current / 1024, 1)}
+
+
+def _peak_rss_kb() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def run(corpus: dict[str, bytes], repeat: int) -> dict:
+    pages = {}
+    for name, page in corpus.items():
+        stages = {stage: _time(fn, repeat) for stage, fn in _stages(page).items()}
+        pages[name] = {"bytes": len(page), "stages": stages, **_allocations(page)}
+    return {"pages": pages, "peak_rss_kb": _peak_rss_kb()}
+
+
+def _delta(current: float, baseline: float | None) -> str:
+    if not baseline:
+        return ""
+    return f"{(current - baseline) / baseline * 100:+.1f}%"
+
+
+def report(results: dict, baseline: dict | None = None):
+    base_pages = (baseline or {}).get("pages", {})
+    for name, page in results["pages"].items():
+        base = base_pages.get(name, {})
+        print(f"\n{name}  ({page['bytes'] / 1024:.0f} KB, alloc peak {page['alloc_peak_kb']} KB)")
+        print(f"  {'stage':<32}{'median ms':>12}{'p95 ms':>12}{'vs baseline':>14}")
+        for stage, timing in page["stages"].items():
+            base_median = base.get("stages", {}).get(stage, {}).get("median_ms")
+            print(
+                f"  {stage:<32}{timing['median_ms']:>12.3f}{timing['p95_ms']:>12.3f}"
+                f"{_delta(timing['median_ms'], base_median):>14}"
+            )
+    print(f"\npeak RSS: {results['peak_rss_kb']} KB")
+
+
+def regressions(results: dict, baseline: dict, max_regression: float) -> list[str]:
+    """Pages whose total median got slower than the baseline by more than max_regression percent."""
+    failed = []
+    for name, page in results["pages"].items():
+        base_median = baseline.get("pages", {}).get(name, {}).get("stages", {}).get("total", {}).get("median_ms")
+        current = page["stages"]["total"]["median_ms"]
+        if base_median and (current - base_median) / base_median * 100 > max_regression:
+            failed.append(f"{name}: {base_median:.3f} ms -> {current:.3f} ms")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline micro-benchmark of the listing extractor")
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES_DIR, help="Directory of recorded *.html pages")
+    parser.add_argument("--synthetic", action="store_true", help="Use the synthetic corpus even if fixtures exist")
+    parser.add_argument("--pages", default="", help="Only run pages whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--baseline", type=Path, help="Compare against a saved results file")
+    parser.add_argument("--save-baseline", type=Path, help="Write these results as a new baseline")
+    parser.add_argument("--max-regression", type=float, help="Exit non-zero if a total median regresses more than this percent")
+    args = parser.parse_args()
+
+    corpus = {name: page for name, page in load_corpus(args.fixtures, args.synthetic).items() if args.pages in name}
+    results = run(corpus, args.repeat)
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else None
+    report(results, baseline)
+
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"baseline saved to {args.save_baseline}")
+    if baseline and args.max_regression is not None:
+        failed = regressions(results, baseline, args.max_regression)
+        if failed:
+            print("\nregressions over {}%:\n  {}".format(args.max_regression, "\n  ".join(failed)))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+"""Loads the benchmark page corpus: recorded fixtures, else synthetic pages."""
+from pathlib import Path
+
+from benchmarks.synthetic import synthetic_corpus
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+
+def recorded_corpus(fixtures_dir: Path = FIXTURES_DIR) -> dict[str, bytes]:
+    return {path.stem: path.read_bytes() for path in sorted(fixtures_dir.glob("*.html"))}
+
+
+def load_corpus(fixtures_dir: Path = FIXTURES_DIR, synthetic: bool = False) -> dict[str, bytes]:
+    """Recorded pages when any exist (unless `synthetic` is forced), otherwise the synthetic set."""
+    corpus = {} if synthetic else recorded_corpus(fixtures_dir)
+    return corpus or synthetic_corpus()
@@ -0,0 +1,45 @@
+"""Records live Play Store listing pages into benchmarks/fixtures/.
+
+    python -m benchmarks.record_fixtures com.spotify.music com.whatsapp --locales en de ja
+
+Each page is saved as <package>.<locale>.html and picked up by the parser
+benchmark in place of the synthetic corpus.
+"""
+import argparse
+import asyncio
+from pathlib import Path
+
+from benchmarks.fixtures import FIXTURES_DIR
+from fetcher import close_http_client, get_http_client
+
+DETAILS_URL = "https://play.google.com/store/apps/details?id={package}&hl={locale}"
+
+
+async def record(packages: list[str], locales: list[str], out_dir: Path = FIXTURES_DIR):
+    out_dir.mkdir(parents=True, exist_ok=True)
+    client = get_http_client()
+    try:
+        for package in packages:
+            for locale in locales:
+                response = await client.get(DETAILS_URL.format(package=package, locale=locale))
+                if response.status_code != 200:
+                    print(f"skip {package} [{locale}]: HTTP {response.status_code}")
+                    continue
+                path = out_dir / f"{package}.{locale}.html"
+                path.write_bytes(response.content)
+                print(f"saved {path} ({len(response.content)} bytes)")
+    finally:
+        await close_http_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("packages", nargs="+", help="Package IDs, e.g. com.spotify.music")
+    parser.add_argument("--locales", nargs="+", default=["en"], help="hl values to record")
+    parser.add_argument("--out", type=Path, default=FIXTURES_DIR)
+    args = parser.parse_args()
+    asyncio.run(record(args.packages, args.locales, args.out))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Deterministic synthetic Play Store listing pages for offline benchmarks.
+
+Pages mimic the real listing layout: appstore meta tags, the JSON-LD
+SoftwareApplication block, the obfuscated-class DOM fields, review markup,
+bulky inline scripts and the AF_initDataCallback 'ds:5' payload. Used when
+no recorded fixtures are available (see record_fixtures.py).
+"""
+import json
+import random
+
+LOCALES = {
+    "en": ("Apps on Google Play", "Install", "reviews", "Rated {rating} stars out of five stars",
+           "Organise your day, track habits and reach your goals faster."),
+    "de": ("Apps bei Google Play", "Installieren", "Rezensionen", "Mit {rating} von fünf Sternen bewertet",
+           "Organisiere deinen Tag, verfolge Gewohnheiten und erreiche deine Ziele schneller."),
+    "ja": ("Google Play のアプリ", "インストール", "件のレビュー", "5 つ星のうち {rating} つ星と評価されています",
+           "毎日の予定を整理し、習慣を記録して、目標をより早く達成しましょう。"),
+    "ar": ("التطبيقات على Google Play", "تثبيت", "مراجعة", "تم تقييمه بـ {rating} من خمس نجوم",
+           "نظّم يومك وتتبّع عاداتك وحقّق أهدافك بشكل أسرع."),
+}
+
+# name -> (inline script KB, review blocks, description paragraphs)
+SIZES = {
+    "small": (8, 5, 3),
+    "typical": (250, 60, 12),
+    "huge": (1800, 600, 40),
+}
+
+
+def _filler_script(rng: random.Random, kb: int) -> str:
+    words = ["var", "function", "return", "this", "window", "data", "null", "true", "0x1f", "push"]
+    parts, size = [], 0
+    while size < kb * 1024:
+        line = " ".join(rng.choice(words) for _ in range(12)) + ";"
+        parts.append(line)
+        size += len(line)
+    return "<script nonce=\"bench\">" + "\n".join(parts) + "</script>"
+
+
+def synthetic_page(locale: str = "en", size: str = "typical", seed: int = 0) -> bytes:
+    suffix, install, reviews_word, rating_label, sentence = LOCALES[locale]
+    script_kb, review_count, paragraphs = SIZES[size]
+    rng = random.Random(f"{locale}-{size}-{seed}")
+
+    package_id = f"com.example.bench{seed}"
+    name = f"Bench Planner {seed}"
+    developer = "Example Labs"
+    rating = f"{rng.uniform(3.0, 5.0):.1f}"
+    rating_count = rng.randint(1_000, 5_000_000)
+    description = "<br>".join(sentence for _ in range(paragraphs))
+
+    json_ld = {
+        "@context": "https://schema.org",
+        "@type": "SoftwareApplication",
+        "name": name,
+        "url": f"https://play.google.com/store/apps/details?id={package_id}&hl={locale}",
+        "description": "\n".join(sentence for _ in range(paragraphs)),
+        "operatingSystem": "ANDROID",
+        "author": {"@type": "Person", "name": developer, "url": "https://labs.example.com"},
+        "aggregateRating": {"@type": "AggregateRating", "ratingValue": rating, "ratingCount": str(rating_count)},
+        "offers": [{"@type": "Offer", "price": "0", "priceCurrency": "USD"}],
+    }
+    details = [None] * 80
+    details[0] = [name]
+    details[13] = ["1,000,000+", 1_000_000]
+    details[51] = [[rating, float(rating)], None, [None, rating_count]]
+    details[68] = [developer]
+    af_payload = json.dumps([None, [None, None, details]], ensure_ascii=False)
+
+    reviews = "".join(
+        f'<div class="RHo1pe"><header class="c1bOId"><div class="X5PpBb">User {i}</div></header>'
+        f'<div class="h3YV2d">{sentence}</div><div class="AJTPZc">{rng.randint(1, 900)}</div></div>'
+        for i in range(review_count)
+    )
+
+    html = (
+        f'<!doctype html><html lang="{locale}"><head><meta charset="utf-8">'
+        f"<title>{name} - {suffix}</title>"
+        '<meta name="appstore:developer_url" content="https://labs.example.com">'
+        f'<meta name="appstore:bundle_id" content="{package_id}">'
+        f'<script type="application/ld+json" nonce="bench">{json.dumps(json_ld, ensure_ascii=False)}</script>'
+        f"{_filler_script(rng, script_kb // 2)}</head><body>"
+        f'<div class="Vbfug auoIOc"><a href="/store/apps/dev?id=1"><span>{developer}</span></a></div>'
+        f'<div class="w7Iutd"><div class="wVqUob"><div class="ClM7O">{rating}<i class="star"></i></div></div>'
+        '<div class="wVqUob"><div class="ClM7O">1M+</div></div></div>'
+        f'<span class="VfPp2b">{install}</span>'
+        f'<div class="bARER" data-g-id="description">{description}</div>'
+        f'<div class="jILTFe">{rating}</div>'
+        f'<div class="I26one" aria-label="{rating_label.format(rating=rating)}"></div>'
+        f'<div class="g1rdde">{rating_count:,} {reviews_word}</div>'
+        f"{reviews}{_filler_script(rng, script_kb - script_kb // 2)}"
+        f"<script nonce=\"bench\">AF_initDataCallback({{key: 'ds:5', hash: '7', data:{af_payload}, sideChannel: {{}}}});</script>"
+        "</body></html>"
+    )
+    return html.encode("utf-8")
+
+
+def synthetic_corpus() -> dict[str, bytes]:
+    """name -> page for every size x locale combination."""
+    return {f"synthetic.{size}.{locale}": synthetic_page(locale, size) for size in SIZES for locale in LOCALES}
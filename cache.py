@@ -0,0 +1,297 @@
+"""Caches for the scrape pipeline."""
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from urllib.parse import parse_qs, urlparse
+
+try:
+    import brotli
+except ImportError:  # optional; installed with httpx[brotli]
+    brotli = None
+
+APP_CACHE_TTL = float(os.getenv("APP_CACHE_TTL", "3600"))
+APP_CACHE_MAX_ENTRIES = int(os.getenv("APP_CACHE_MAX_ENTRIES", "1024"))
+ANALYSIS_CACHE_PATH = os.getenv("ANALYSIS_CACHE_PATH", "analysis_cache.sqlite3")
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", str(APP_CACHE_TTL)))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+# Compressed variants are only worth keeping for bodies at least this large
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+
+
+def listing_locale(url: str) -> str:
+    """Display language (hl) of a listing URL, "en" when not given."""
+    return parse_qs(urlparse(url).query).get("hl", ["en"])[0].lower()
+
+
+def app_cache_key(url: str) -> str:
+    """Canonical key for a listing URL: package ID plus locale (hl/gl)."""
+    parsed = urlparse(url)
+    query = parse_qs(parsed.query)
+    package_id = query.get("id", [""])[0].strip()
+    if not package_id:
+        # Not a details URL we understand; fall back to the URL itself
+        return url
+    hl = listing_locale(url)
+    gl = query.get("gl", [""])[0].upper()
+    return f"{package_id}|{hl}|{gl}"
+
+
+@dataclass
+class AppDataEntry:
+    app_data: dict
+    etag: str | None = None
+    last_modified: str | None = None
+    stored_at: float = field(default_factory=time.monotonic)
+
+    def conditional_headers(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class AppDataCache:
+    """Size-bounded LRU of scraped app_data with a TTL.
+
+    Expired entries are kept (until evicted) so they can be revalidated with
+    If-None-Match / If-Modified-Since instead of being refetched outright.
+    Only touched from the event loop, so no locking is needed.
+    """
+
+    def __init__(self, ttl: float = APP_CACHE_TTL, max_entries: int = APP_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, AppDataEntry] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+
+    def lookup(self, key: str) -> tuple[AppDataEntry | None, bool]:
+        """Returns (entry, fresh). A stale entry is returned for revalidation."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None, False
+        self._entries.move_to_end(key)
+        if time.monotonic() - entry.stored_at < self.ttl:
+            self.hits += 1
+            return entry, True
+        self.misses += 1
+        return entry, False
+
+    def store(self, key: str, app_data: dict, etag: str | None = None, last_modified: str | None = None):
+        self._insert(key, AppDataEntry(app_data, etag, last_modified))
+
+    def mark_revalidated(self, key: str, entry: AppDataEntry) -> AppDataEntry:
+        """Refreshes a stale entry after the origin answered 304 Not Modified.
+
+        Takes the entry the conditional request was built from, since it may
+        have been evicted while the request was in flight.
+        """
+        entry.stored_at = time.monotonic()
+        self._insert(key, entry)
+        self.revalidated += 1
+        return entry
+
+    def _insert(self, key: str, entry: AppDataEntry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def analysis_cache_key(app_data: dict, prompt_version: str, model: str) -> str:
+    """Content hash of the normalised app_data plus the prompt version and model."""
+    normalised = {str(k).strip(): v.strip() if isinstance(v, str) else v for k, v in app_data.items()}
+    payload = json.dumps(normalised, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    digest = hashlib.sha256()
+    for part in (model, prompt_version, payload):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """Persistent SQLite store of analysis_result dicts keyed by content hash.
+
+    Calls block on disk I/O, so run them off the event loop.
+    """
+
+    def __init__(self, path: str = ANALYSIS_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self.hits = 0
+        self.misses = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Opened lazily (under the lock) so the cache can be closed and reused
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS analyses ("
+                " key TEXT PRIMARY KEY,"
+                " model TEXT NOT NULL,"
+                " prompt_version TEXT NOT NULL,"
+                " result TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            row = self._connection().execute("SELECT result FROM analyses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, result: dict, model: str, prompt_version: str):
+        encoded = json.dumps(result, ensure_ascii=False)
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO analyses (key, model, prompt_version, result, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, model, prompt_version, encoded, time.time()),
+            )
+            conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._connection().execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "size": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+@dataclass
+class EncodedResponse:
+    """A JSON body encoded once, with its strong ETag and compressed variants."""
+
+    body: bytes
+    etag: str
+    variants: dict[str, bytes] = field(default_factory=dict)
+    stored_at: float = field(default_factory=time.monotonic)
+
+    def etag_for(self, encoding: str | None) -> str:
+        # Each content-coding is its own representation, so it gets its own strong ETag
+        return self.etag if encoding is None else f'{self.etag[:-1]}-{encoding}"'
+
+
+def encode_response(content) -> EncodedResponse:
+    """Encodes content the way JSONResponse does, plus gzip/brotli variants."""
+    body = json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    variants = {}
+    if len(body) >= RESPONSE_COMPRESS_MIN_BYTES:
+        if brotli is not None:
+            variants["br"] = brotli.compress(body, quality=5)
+        variants["gzip"] = gzip.compress(body, compresslevel=6)
+    return EncodedResponse(body, etag, variants)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Weak comparison (as If-None-Match requires), ignoring our content-coding suffix."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    wanted = etag.strip('"')
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip().removeprefix("W/").strip('"')
+        if candidate.split("-", 1)[0] == wanted:
+            return True
+    return False
+
+
+def negotiate_encoding(accept_encoding: str, available) -> str | None:
+    """Picks br, then gzip, if the client accepts it and a variant exists."""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding.strip())
+    for coding in ("br", "gzip"):
+        if coding in available and (coding in accepted or "*" in accepted):
+            return coding
+    return None
+
+
+class ResponseCache:
+    """Size-bounded LRU of pre-serialised /scrape responses with a TTL."""
+
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, EncodedResponse] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key: str) -> EncodedResponse | None:
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry.stored_at >= self.ttl:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, entry: EncodedResponse):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,48 @@
+"""End-to-end request deadlines.
+
+A request's Deadline lives in a contextvar so every stage (and the tasks it
+starts) can see how much time is left without threading it through each
+call. Fetch and parse get a share of the total; the analysis gets whatever
+remains, and when that runs out the endpoints answer with app_data and the
+analysis marked pending.
+"""
+import os
+import time
+from contextvars import ContextVar
+
+REQUEST_DEADLINE_MS = int(os.getenv("REQUEST_DEADLINE_MS", "60000"))
+REQUEST_DEADLINE_MAX_MS = int(os.getenv("REQUEST_DEADLINE_MAX_MS", "120000"))
+# Share of the deadline fetch + parse may use; the analysis gets the rest
+DEADLINE_FETCH_SHARE = float(os.getenv("DEADLINE_FETCH_SHARE", "0.4"))
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def from_timeout_ms(cls, timeout_ms: int | None) -> "Deadline":
+        """The request's deadline: `timeout_ms` if given, capped at REQUEST_DEADLINE_MAX_MS."""
+        ms = REQUEST_DEADLINE_MS if timeout_ms is None else min(max(timeout_ms, 1), REQUEST_DEADLINE_MAX_MS)
+        return cls(ms / 1000)
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def budget(self, share: float) -> float:
+        """Time for a stage allowed `share` of the whole deadline, bounded by what is left."""
+        return min(self.seconds * share, self.remaining())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+deadline_var: ContextVar[Deadline | None] = ContextVar("deadline", default=None)
+
+
+def remaining_or(default: float) -> float:
+    """`default` seconds, cut down to what is left of the current request's deadline."""
+    deadline = deadline_var.get()
+    return default if deadline is None else min(default, deadline.remaining())
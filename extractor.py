@@ -0,0 +1,359 @@
+"""Extraction of app_data fields from a Play Store listing page.
+
+Fields are read first from the structured data Google embeds in the page
+(the JSON-LD SoftwareApplication block and the AF_initDataCallback 'ds:5'
+payload), located with a plain regex scan over the raw bytes. Anything still
+missing comes from the DOM path: the fields are described declaratively in
+FIELD_SPECS and compiled into a per-tag lookup plan, and ListingExtractor
+walks the page with the streaming stdlib HTMLParser, so no tree is ever
+built, stopping as soon as every requested field has been found.
+"""
+import codecs
+import json
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from html.parser import HTMLParser
+from urllib.parse import parse_qs, urlparse
+
+NOT_AVAILABLE = "Not Available"
+
+# Elements that never get an end tag, so they must not go on the open-element stack
+VOID_ELEMENTS = frozenset(
+    ["area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"]
+)
+
+FEED_CHUNK_SIZE = 64 * 1024
+STRUCTURED_DATA_ENABLED = os.getenv("EXTRACT_STRUCTURED_DATA", "1") != "0"
+
+JSON_LD_RE = re.compile(rb'<script[^>]*type="application/ld\+json"[^>]*>(.*?)</script>', re.S)
+AF_DATA_RE = re.compile(rb"AF_initDataCallback\(\{key: '(ds:\d+)', hash: '[^']*', data:(.*?), sideChannel: \{\}\}\);</script", re.S)
+
+# Where the app details live inside the 'ds:5' AF_initDataCallback payload
+AF_DATASET = b"ds:5"
+AF_FIELD_PATHS = (
+    ("Name", (1, 2, 0, 0)),
+    ("Rating", (1, 2, 51, 0, 1)),
+    ("Number of Downloads", (1, 2, 13, 0)),
+    ("Developer", (1, 2, 68, 0)),
+)
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    """How to locate one app_data field.
+
+    Matches the `index`-th `tag` element carrying all of `classes` (and any
+    `attrs`). If `child` is set, the value comes from the first `child`
+    element inside the match instead. The value is the element's stripped
+    text, or the attribute named by `attr`.
+    """
+
+    key: str
+    tag: str
+    classes: frozenset = frozenset()
+    attrs: tuple = ()
+    index: int = 0
+    child: str | None = None
+    attr: str | None = None
+    default: str = NOT_AVAILABLE
+
+    def matches(self, attrs: dict) -> bool:
+        if self.classes and not self.classes.issubset(attrs.get("class", "").split()):
+            return False
+        return all(attrs.get(name) == value for name, value in self.attrs)
+
+
+def _spec(key, tag, classes="", **kwargs) -> FieldSpec:
+    return FieldSpec(key, tag, frozenset(classes.split()), **kwargs)
+
+
+FIELD_SPECS = (
+    _spec("Name", "title"),
+    _spec("Developer URL", "meta", attrs=(("name", "appstore:developer_url"),), attr="content"),
+    _spec("Bundle ID", "meta", attrs=(("name", "appstore:bundle_id"),), attr="content"),
+    _spec("Description", "div", "bARER"),
+    _spec("Rating", "div", "jILTFe"),
+    _spec("Rating Description", "div", "I26one", attr="aria-label"),
+    _spec("Number of Reviews", "div", "g1rdde"),
+    # The first ClM7O block is the rating badge; the second holds downloads
+    _spec("Number of Downloads", "div", "ClM7O", index=1),
+    _spec("Developer", "div", "Vbfug auoIOc", child="span"),
+    _spec("Price", "span", "VfPp2b", default="Free"),
+)
+
+
+def compile_plan(specs) -> dict[str, tuple[int, ...]]:
+    """Maps tag name -> indexes of the specs that can match that tag."""
+    plan: dict[str, list[int]] = {}
+    for i, spec in enumerate(specs):
+        plan.setdefault(spec.tag, []).append(i)
+    return {tag: tuple(indexes) for tag, indexes in plan.items()}
+
+
+EXTRACTION_PLAN = compile_plan(FIELD_SPECS)
+
+
+class ListingExtractor(HTMLParser):
+    """Incremental extractor: feed() page chunks, then read result()."""
+
+    def __init__(self, specs=FIELD_SPECS, plan=EXTRACTION_PLAN):
+        super().__init__(convert_charrefs=True)
+        self.specs = specs
+        self.plan = plan
+        self.values: dict[str, str] = {}
+        self._seen = [0] * len(specs)
+        self._pending = set(range(len(specs)))
+        self._stack: list[str] = []
+        # Active text captures: [spec index, stack depth at open, text parts]
+        self._captures: list[list] = []
+        # Matched parents waiting for their child element: spec index -> depth
+        self._parents: dict[int, int] = {}
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    @property
+    def complete(self) -> bool:
+        return not self._pending
+
+    def feed_bytes(self, chunk: bytes, final: bool = False):
+        self.feed(self._decoder.decode(chunk, final))
+
+    def handle_starttag(self, tag, attrs):
+        attr_map = None
+        for i in self.plan.get(tag, ()):
+            if i not in self._pending:
+                continue
+            spec = self.specs[i]
+            if attr_map is None:
+                attr_map = {name: value or "" for name, value in attrs}
+            if not spec.matches(attr_map):
+                continue
+            self._seen[i] += 1
+            if self._seen[i] - 1 != spec.index:
+                continue
+            if spec.child:
+                self._parents[i] = len(self._stack)
+            elif spec.attr:
+                self._resolve(i, attr_map[spec.attr] if spec.attr in attr_map else spec.default)
+            elif tag not in VOID_ELEMENTS:
+                self._captures.append([i, len(self._stack), []])
+
+        for i, depth in list(self._parents.items()):
+            if tag == self.specs[i].child and len(self._stack) > depth:
+                del self._parents[i]
+                self._captures.append([i, len(self._stack), []])
+
+        if tag not in VOID_ELEMENTS:
+            self._stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        # <x/> has no content, so only attribute fields can resolve from it
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS and self._stack and self._stack[-1] == tag:
+            self._stack.pop()
+            self._close_to(len(self._stack))
+
+    def handle_endtag(self, tag):
+        # Pop back to the matching open element, tolerating unclosed tags
+        for depth in range(len(self._stack) - 1, -1, -1):
+            if self._stack[depth] == tag:
+                del self._stack[depth:]
+                self._close_to(depth)
+                return
+
+    def handle_data(self, data):
+        for capture in self._captures:
+            capture[2].append(data)
+
+    def _close_to(self, depth: int):
+        while self._captures and self._captures[-1][1] >= depth:
+            i, _, parts = self._captures.pop()
+            self._resolve(i, "".join(parts).strip())
+        for i, parent_depth in list(self._parents.items()):
+            if parent_depth >= depth:
+                # Parent closed without the child element
+                del self._parents[i]
+                self._resolve(i, self.specs[i].default)
+
+    def _resolve(self, i: int, value: str):
+        if i in self._pending:
+            self._pending.discard(i)
+            self.values[self.specs[i].key] = value
+
+    def discard(self, keys):
+        """Stops looking for fields that were resolved some other way."""
+        for i, spec in enumerate(self.specs):
+            if spec.key in keys:
+                self._pending.discard(i)
+
+    def close(self):
+        super().close()
+        # Text captures still open at end of input keep what they collected
+        self._close_to(0)
+
+    def result(self) -> dict:
+        """app_data in FIELD_SPECS order, with defaults for fields never found."""
+        return {spec.key: self.values.get(spec.key, spec.default) for spec in self.specs}
+
+
+def extract_dom_fields(content: bytes, specs=FIELD_SPECS) -> dict:
+    """Runs the DOM path for `specs`, stopping once all of them are found."""
+    extractor = ListingExtractor(specs, _plan_for(specs))
+    for start in range(0, len(content), FEED_CHUNK_SIZE):
+        extractor.feed_bytes(content[start:start + FEED_CHUNK_SIZE])
+        if extractor.complete:
+            break
+    else:
+        extractor.feed_bytes(b"", final=True)
+        extractor.close()
+    return extractor.result()
+
+
+@lru_cache(maxsize=None)
+def _plan_for(specs) -> dict[str, tuple[int, ...]]:
+    return EXTRACTION_PLAN if specs is FIELD_SPECS else compile_plan(specs)
+
+
+def _format_rating(value) -> str:
+    try:
+        return f"{float(value):.1f}"
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def _json_ld_fields(content: bytes) -> dict | None:
+    """Fields of the first SoftwareApplication JSON-LD block, None if there is none."""
+    for match in JSON_LD_RE.finditer(content):
+        try:
+            block = json.loads(match.group(1))
+        except ValueError:
+            continue
+        if not isinstance(block, dict) or block.get("@type") != "SoftwareApplication":
+            continue
+
+        fields = {}
+        if block.get("name"):
+            fields["Name"] = str(block["name"]).strip()
+        if block.get("description"):
+            fields["Description"] = str(block["description"]).strip()
+        package_id = parse_qs(urlparse(str(block.get("url", ""))).query).get("id")
+        if package_id:
+            fields["Bundle ID"] = package_id[0]
+        author = block.get("author")
+        if isinstance(author, dict):
+            if author.get("name"):
+                fields["Developer"] = str(author["name"]).strip()
+            if author.get("url"):
+                fields["Developer URL"] = str(author["url"])
+        rating = block.get("aggregateRating")
+        if isinstance(rating, dict) and rating.get("ratingValue") is not None:
+            fields["Rating"] = _format_rating(rating["ratingValue"])
+        offers = block.get("offers")
+        offer = offers[0] if isinstance(offers, list) and offers else offers
+        if isinstance(offer, dict) and offer.get("price") is not None:
+            price = str(offer["price"])
+            fields["Price"] = "Free" if price in ("0", "0.0") else f"{price} {offer.get('priceCurrency', '')}".strip()
+        return fields
+    return None
+
+
+def _af_fields(content: bytes) -> dict | None:
+    """Fields of the first 'ds:5' payload, None if there is none."""
+    for match in AF_DATA_RE.finditer(content):
+        if match.group(1) != AF_DATASET:
+            continue
+        try:
+            data = json.loads(match.group(2))
+        except ValueError:
+            return {}
+
+        fields = {}
+        for key, path in AF_FIELD_PATHS:
+            value = data
+            try:
+                for index in path:
+                    value = value[index]
+            except (IndexError, KeyError, TypeError):
+                continue
+            if isinstance(value, (str, int, float)) and not isinstance(value, bool):
+                fields[key] = _format_rating(value) if key == "Rating" else str(value).strip()
+        return fields
+    return None
+
+
+def _merge_structured(af: dict | None, json_ld: dict | None) -> dict:
+    # JSON-LD wins over the AF payload
+    return {**(af or {}), **(json_ld or {})}
+
+
+def extract_structured_data(content: bytes) -> dict:
+    """Fields found in the embedded JSON-LD / AF_initDataCallback blobs (JSON-LD wins)."""
+    return _merge_structured(_af_fields(content), _json_ld_fields(content))
+
+
+SCRIPT_END = b"</script>"
+
+
+class IncrementalExtractor:
+    """Runs both extraction paths over a page as it downloads.
+
+    Each newly completed stretch of script blocks is scanned once for
+    structured data; fields it provides are dropped from the DOM pass. Since
+    structured data wins over the DOM, as in extract_app_data, `complete`
+    only turns true once every field is resolved and both structured blobs
+    have been seen (or the page ended), so the caller can stop downloading
+    without changing the result. On pages that end with the 'ds:5' payload
+    that means reading the whole page anyway.
+    """
+
+    def __init__(self):
+        # Page bytes after the last scanned script end tag
+        self._buffer = bytearray()
+        self._af: dict | None = None
+        self._json_ld: dict | None = None
+        self._dom = ListingExtractor()
+
+    @property
+    def complete(self) -> bool:
+        if STRUCTURED_DATA_ENABLED and (self._af is None or self._json_ld is None):
+            return False
+        return self._dom.complete
+
+    def feed(self, chunk: bytes):
+        if STRUCTURED_DATA_ENABLED and (self._af is None or self._json_ld is None):
+            # Look a little behind the chunk in case "</script>" straddles the boundary
+            start = max(len(self._buffer) - len(SCRIPT_END), 0)
+            self._buffer += chunk
+            end = self._buffer.rfind(SCRIPT_END, start)
+            if end != -1:
+                # Script blocks do not nest, so the next one starts after the last end tag
+                end += len(SCRIPT_END)
+                self._scan(bytes(self._buffer[:end]))
+                del self._buffer[:end]
+        self._dom.feed_bytes(chunk)
+
+    def _scan(self, content: bytes):
+        if self._af is None:
+            self._af = _af_fields(content)
+        if self._json_ld is None:
+            self._json_ld = _json_ld_fields(content)
+        self._dom.discard(_merge_structured(self._af, self._json_ld))
+
+    def finish(self):
+        self._dom.feed_bytes(b"", final=True)
+        self._dom.close()
+
+    def result(self) -> dict:
+        app_data = self._dom.result()
+        app_data.update(_merge_structured(self._af, self._json_ld))
+        return {spec.key: app_data[spec.key] for spec in FIELD_SPECS}
+
+
+def extract_app_data(content: bytes) -> dict:
+    """Parses listing HTML into app_data, using the DOM only for fields structured data lacks."""
+    app_data = extract_structured_data(content) if STRUCTURED_DATA_ENABLED else {}
+    missing = tuple(spec for spec in FIELD_SPECS if spec.key not in app_data)
+    if missing:
+        app_data.update(extract_dom_fields(content, missing))
+    return {spec.key: app_data[spec.key] for spec in FIELD_SPECS}
@@ -0,0 +1,125 @@
+"""Shared async HTTP client used to fetch Google Play Store listing pages."""
+import os
+from dataclasses import dataclass
+
+import httpx
+
+from deadline import remaining_or
+
+PLAYSTORE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+# Timeouts and pool sizing (seconds / connection counts), overridable via env vars
+CONNECT_TIMEOUT = float(os.getenv("PLAYSTORE_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("PLAYSTORE_READ_TIMEOUT", "15"))
+POOL_TIMEOUT = float(os.getenv("PLAYSTORE_POOL_TIMEOUT", "10"))
+MAX_CONNECTIONS = int(os.getenv("PLAYSTORE_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("PLAYSTORE_MAX_KEEPALIVE_CONNECTIONS", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("PLAYSTORE_KEEPALIVE_EXPIRY", "30"))
+HTTP2_ENABLED = os.getenv("PLAYSTORE_HTTP2", "1") != "0"
+# Stream pages into the extractor and hang up once every field is found. Off by
+# default: the 'ds:5' payload is the last script on current listings, so the
+# download rarely ends early and parsing chunk by chunk costs more than in one go
+INCREMENTAL_FETCH = os.getenv("PLAYSTORE_INCREMENTAL_FETCH", "0") != "0"
+
+_client: httpx.AsyncClient | None = None
+
+
+@dataclass
+class FetchStats:
+    """Bytes pulled off the wire vs. what the complete pages would have cost."""
+
+    pages: int = 0
+    early_terminated: int = 0
+    bytes_downloaded: int = 0
+    # Only pages whose full size is known (Content-Length, or read to the end)
+    sized_pages: int = 0
+    sized_bytes_downloaded: int = 0
+    sized_full_page_bytes: int = 0
+
+    def record(self, response: httpx.Response, early: bool = False):
+        downloaded = response.num_bytes_downloaded
+        self.pages += 1
+        self.bytes_downloaded += downloaded
+        if early:
+            self.early_terminated += 1
+        content_length = response.headers.get("content-length")
+        if content_length and content_length.isdigit():
+            full = int(content_length)
+        elif not early:
+            full = downloaded
+        else:
+            return
+        self.sized_pages += 1
+        self.sized_bytes_downloaded += downloaded
+        self.sized_full_page_bytes += full
+
+    def stats(self) -> dict:
+        full = self.sized_full_page_bytes
+        return {
+            "incremental": INCREMENTAL_FETCH,
+            "pages": self.pages,
+            "early_terminated": self.early_terminated,
+            "bytes_downloaded": self.bytes_downloaded,
+            "sized_pages": self.sized_pages,
+            "sized_bytes_downloaded": self.sized_bytes_downloaded,
+            "sized_full_page_bytes": full,
+            "bytes_saved_ratio": round(1 - self.sized_bytes_downloaded / full, 4) if full else 0.0,
+        }
+
+
+fetch_stats = FetchStats()
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Builds a pooled HTTP/2 client; httpx negotiates gzip/deflate/br transfer encoding itself."""
+    return httpx.AsyncClient(
+        http2=HTTP2_ENABLED,
+        headers=PLAYSTORE_HEADERS,
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT, pool=POOL_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        follow_redirects=True,
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Returns the app-lifetime client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_http_client()
+    return _client
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _request_timeout() -> httpx.Timeout:
+    """The client timeouts, cut down to what is left of the request's deadline."""
+    return httpx.Timeout(
+        remaining_or(READ_TIMEOUT), connect=remaining_or(CONNECT_TIMEOUT), pool=remaining_or(POOL_TIMEOUT)
+    )
+
+
+async def fetch_playstore_page(url: str, headers: dict | None = None) -> httpx.Response:
+    """Fetches a Play Store listing page over the shared connection pool."""
+    response = await get_http_client().get(url, headers=headers, timeout=_request_timeout())
+    fetch_stats.record(response)
+    return response
+
+
+def stream_playstore_page(url: str, headers: dict | None = None):
+    """Async context manager yielding a response whose body has not been read yet.
+
+    Leaving the block before the body is exhausted closes the stream, which
+    stops the rest of the page from being downloaded.
+    """
+    return get_http_client().stream("GET", url, headers=headers, timeout=_request_timeout())
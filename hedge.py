@@ -0,0 +1,133 @@
+"""Hedged requests against tail latency.
+
+A call that has not finished by the stage's observed latency percentile
+(p95 by default) gets a duplicate; whichever finishes first wins and the
+other is cancelled. Hedges are paid from a credit that grows by
+HEDGE_MAX_RATIO per call, so at most that share of calls is duplicated
+(plus a small burst). Hedging is off unless the stage is listed in
+HEDGE_STAGES, e.g. "fetch,openai".
+"""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, TypeVar
+
+from metrics import HEDGE_REQUESTS, HEDGE_WINS
+
+T = TypeVar("T")
+
+HEDGE_STAGES = {stage.strip() for stage in os.getenv("HEDGE_STAGES", "").split(",") if stage.strip()}
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+# Latencies kept per key, and how many are needed before hedging starts
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "500"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+# Share of calls that may be hedged, and how many hedges may be banked
+HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.05"))
+HEDGE_BURST = float(os.getenv("HEDGE_BURST", "5"))
+
+
+class Hedger:
+    """Runs calls of one pipeline stage, hedging the slow ones."""
+
+    def __init__(
+        self,
+        stage: str,
+        enabled: bool | None = None,
+        percentile: float = HEDGE_PERCENTILE,
+        max_ratio: float = HEDGE_MAX_RATIO,
+    ):
+        self.stage = stage
+        self.enabled = stage in HEDGE_STAGES if enabled is None else enabled
+        self.percentile = percentile
+        self.max_ratio = max_ratio
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.capped = 0
+        self._credit = 0.0
+        # Latencies per key, so calls with different expected durations are judged apart
+        self._samples: dict[str, deque[float]] = {}
+
+    def threshold(self, key: str = "") -> float | None:
+        """Seconds after which a call for `key` is hedged; None until enough samples."""
+        samples = self._samples.get(key)
+        if not samples or len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(math.ceil(self.percentile * len(ordered)) - 1, len(ordered) - 1)]
+
+    def _observe(self, key: str, seconds: float):
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = deque(maxlen=HEDGE_WINDOW)
+        samples.append(seconds)
+
+    def _take_credit(self) -> bool:
+        if self._credit < 1:
+            self.capped += 1
+            return False
+        self._credit -= 1
+        return True
+
+    async def run(
+        self, fn: Callable[[], Awaitable[T]], key: str = "", when: Callable[[], bool] | None = None
+    ) -> T:
+        """Result of the first of fn() and, if it is slow, a second fn() to finish.
+
+        `when` can veto a hedge that is due, e.g. while there is no spare
+        capacity for it. A failed attempt does not win while the other one is
+        still running; if both fail the first call's exception is raised.
+        """
+        self.calls += 1
+        if not self.enabled:
+            return await fn()
+        self._credit = min(self._credit + self.max_ratio, HEDGE_BURST)
+        delay = self.threshold(key)
+        primary = asyncio.ensure_future(fn())
+        started = {primary: time.perf_counter()}
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done and (when is None or when()) and self._take_credit():
+                    hedge = asyncio.ensure_future(fn())
+                    started[hedge] = time.perf_counter()
+                    self.hedged += 1
+                    HEDGE_REQUESTS.inc(stage=self.stage)
+            pending = set(started)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # The first call wins ties
+                for task in sorted(done, key=lambda t: t is not primary):
+                    if task.cancelled() or task.exception() is not None:
+                        continue
+                    self._observe(key, time.perf_counter() - started[task])
+                    if task is not primary:
+                        self.hedge_wins += 1
+                        HEDGE_WINS.inc(stage=self.stage)
+                    return task.result()
+            return primary.result()
+        finally:
+            for task in started:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    # Mark a losing attempt's exception as retrieved
+                    task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "percentile": self.percentile,
+            "max_ratio": self.max_ratio,
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "capped": self.capped,
+            "thresholds": {
+                key: round(threshold, 3)
+                for key in self._samples
+                if (threshold := self.threshold(key)) is not None
+            },
+        }
@@ -0,0 +1,156 @@
+"""In-process job queue for running scrape + analysis in the background."""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from fetcher import get_http_client
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_QUEUE = int(os.getenv("JOB_MAX_QUEUE", "1000"))
+# How long finished jobs stay pollable
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+JOB_CALLBACK_TIMEOUT = float(os.getenv("JOB_CALLBACK_TIMEOUT", "10"))
+
+logger = logging.getLogger("aso.jobs")
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    url: str
+    bypass_cache: bool = False
+    callback_url: str | None = None
+    # Analysis output fields; None runs the full analysis
+    analysis_fields: tuple | None = None
+    priority: str = "bulk"
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "queued"  # queued | running | succeeded | failed
+    result: dict | None = None
+    error: str | None = None
+    callback_status: str | None = None
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "url": self.url,
+            "priority": self.priority,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "callback_url": self.callback_url,
+            "callback_status": self.callback_status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """Bounded queue drained by a fixed pool of asyncio worker tasks.
+
+    `runner` executes a job and returns its result dict, raising on failure.
+    Job state is kept in memory for JOB_RETENTION_SECONDS after completion.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[Job], Awaitable[dict]],
+        workers: int = JOB_WORKERS,
+        max_queue: int = JOB_MAX_QUEUE,
+        retention: float = JOB_RETENTION_SECONDS,
+    ):
+        self.runner = runner
+        self.workers = workers
+        self.max_queue = max_queue
+        self.retention = retention
+        self._jobs: dict[str, Job] = {}
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, job: Job) -> Job:
+        if self._queue is None:
+            raise RuntimeError("JobManager has not been started")
+        self._prune()
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFull(f"Job queue is full ({self.max_queue} pending)")
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    def stats(self) -> dict:
+        counts: dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"workers": self.workers, "queued": self._queue.qsize() if self._queue else 0, "jobs": counts}
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            except Exception:
+                # Whatever one job does, the worker lives on for the next
+                logger.exception("job worker error", extra={"job_id": job.id})
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = await self.runner(job)
+            job.status = "succeeded"
+        except asyncio.CancelledError:
+            job.status = "failed"
+            job.error = "Job cancelled"
+            raise
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+        logger.info("job finished", extra={
+            "job_id": job.id, "status": job.status, "duration_s": round(job.finished_at - job.started_at, 3),
+        })
+        if job.callback_url:
+            await self._notify(job)
+
+    async def _notify(self, job: Job):
+        """Best-effort webhook POST of the finished job."""
+        try:
+            response = await get_http_client().post(job.callback_url, json=job.to_dict(), timeout=JOB_CALLBACK_TIMEOUT)
+            job.callback_status = f"delivered ({response.status_code})"
+        except Exception as e:
+            # httpx.InvalidURL and friends are not httpx.HTTPError subclasses
+            job.callback_status = f"failed ({e.__class__.__name__})"
+            logger.warning("job callback failed", extra={"job_id": job.id, "callback_url": job.callback_url, "error": str(e)})
@@ -0,0 +1,215 @@
+"""Local keyword extraction for the `keywords` analysis field.
+
+Candidates are 1-3 word phrases that do not cross stop words or
+punctuation (RAKE-style). Each is scored by how often it occurs times the
+mean IDF of its words against a background corpus, so words that appear in
+every listing ("app", "free", "download") rank low. In batch mode the
+documents being scored also count towards the document frequencies, and
+phrase weights are shared across the batch.
+
+The stop words and tokenizer are built for English; listings in other
+languages (KEYWORDS_LANGUAGES) should get their keywords from the LLM.
+"""
+import heapq
+import json
+import math
+import os
+import re
+import sys
+import unicodedata
+from collections import Counter
+from itertools import chain
+
+KEYWORDS_LOCAL = os.getenv("KEYWORDS_LOCAL", "true").lower() in ("1", "true", "yes")
+KEYWORDS_TOP_N = int(os.getenv("KEYWORDS_TOP_N", "10"))
+KEYWORDS_MAX_NGRAM = int(os.getenv("KEYWORDS_MAX_NGRAM", "3"))
+# Optional JSON file with {"documents": N, "df": {term: count}} built by `python -m keywords`
+KEYWORDS_CORPUS_PATH = os.getenv("KEYWORDS_CORPUS_PATH")
+# Listing languages (hl) the local extractor is used for
+KEYWORDS_LANGUAGES = {
+    lang.strip().lower() for lang in os.getenv("KEYWORDS_LANGUAGES", "en").split(",") if lang.strip()
+}
+
+STOP_WORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each even ever every few for from further get
+gets got had has have having he her here hers herself him himself his how i if in into is it its itself
+just let like ll made make makes many may me more most much must my myself need new no nor not now of off
+on once one only or other our ours ourselves out over own per re s same she should so some such t than
+that the their theirs them themselves then there these they this those through to too under until up us
+use used using very via want was way we well were what when where which while who whom why will with
+within without would yet you your yours yourself yourselves
+""".split())
+
+# Terms near-universal in Play Store descriptions, used as the built-in
+# background when no corpus file is configured
+_BOILERPLATE = (
+    "app apps application free download install play store google android phone device best easy simple "
+    "great feature features support update version love enjoy help time day today start now fast quickly "
+    "experience user users world first please contact email feedback privacy policy terms service rate "
+    "review reviews star stars thanks thank try available"
+).split()
+
+
+def _mark_class() -> str:
+    """Regex class body of every combining mark (Unicode category M), which \\w leaves out."""
+    ranges = []
+    for cp in range(sys.maxunicode + 1):
+        if unicodedata.category(chr(cp))[0] != "M":
+            continue
+        if ranges and ranges[-1][1] == cp - 1:
+            ranges[-1][1] = cp
+        else:
+            ranges.append([cp, cp])
+    return "".join(re.escape(chr(a)) if a == b else f"{re.escape(chr(a))}-{re.escape(chr(b))}" for a, b in ranges)
+
+
+_MARKS = _mark_class()
+# Letters, with any combining marks (Arabic harakat, Indic vowel signs, ...) inside or after them
+_WORD = rf"[^\W\d_]+(?:[{_MARKS}]+[^\W\d_]*)*"
+# Words, or sentence and clause punctuation, which ends a phrase just like a stop word does
+_TOKEN_RE = re.compile(rf"({_WORD}(?:['’-]{_WORD})*)|[^\w\s'’{_MARKS}-]+|\n")
+
+
+class BackgroundCorpus:
+    """Document frequencies of terms across a reference set of descriptions."""
+
+    def __init__(self, documents: int = 0, df: dict[str, int] | None = None):
+        self.documents = documents
+        self.df = Counter(df or {})
+
+    @classmethod
+    def builtin(cls) -> "BackgroundCorpus":
+        # Boilerplate terms behave as if they occur in 90% of 1000 listings
+        return cls(1000, {term: 900 for term in _BOILERPLATE})
+
+    @classmethod
+    def load(cls, path: str) -> "BackgroundCorpus":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["documents"], data["df"])
+
+    def dump(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"documents": self.documents, "df": dict(self.df.most_common())}, f, ensure_ascii=False)
+
+    def add_document(self, terms):
+        self.documents += 1
+        self.df.update(set(terms))
+
+    def idf(self, term: str, extra_documents: int = 0, extra_df: Counter | None = None) -> float:
+        documents = self.documents + extra_documents
+        df = self.df.get(term, 0) + (extra_df.get(term, 0) if extra_df else 0)
+        return math.log((documents + 1) / (df + 1)) + 1
+
+
+def local_keywords_for(hl: str) -> bool:
+    """Whether listings in language `hl` (e.g. "en", "en-GB") get local keywords."""
+    return KEYWORDS_LOCAL and hl.replace("_", "-").split("-")[0].lower() in KEYWORDS_LANGUAGES
+
+
+background_corpus = BackgroundCorpus.load(KEYWORDS_CORPUS_PATH) if KEYWORDS_CORPUS_PATH else BackgroundCorpus.builtin()
+
+
+def tokenize(text: str) -> list[str | None]:
+    """Lower-cased words of text, with None wherever a stop word or punctuation ends a phrase."""
+    return [
+        word if word and len(word) > 1 and word not in STOP_WORDS else None
+        for word in _TOKEN_RE.findall(text.lower())
+    ]
+
+
+def candidates(tokens: list[str | None], max_ngram: int = KEYWORDS_MAX_NGRAM) -> Counter:
+    """Counts of every 1..max_ngram word n-gram that does not cross a phrase break."""
+    # Words are counted as strings, which hash much faster than 1-tuples
+    counts = Counter({(word,): count for word, count in Counter(tokens).items() if word})
+    # Count every longer window, then drop the (far fewer) distinct ones spanning a break
+    counts.update(chain.from_iterable(zip(*(tokens[i:] for i in range(n))) for n in range(2, max_ngram + 1)))
+    for ngram in [ngram for ngram in counts if None in ngram]:
+        del counts[ngram]
+    return counts
+
+
+def _rank(counts: Counter, idf: dict[str, float], top_n: int, idf_sums: dict | None = None) -> list[str]:
+    """Top phrases of counts; `idf_sums` caches each phrase's summed IDF across calls."""
+    idf_sums = {} if idf_sums is None else idf_sums
+    for ngram in [ngram for ngram in counts if ngram not in idf_sums]:
+        idf_sums[ngram] = sum(idf[w] for w in ngram)
+    # Longer phrases get a mild boost; ties fall back to the phrase itself for stable output
+    scored = [(-count * idf_sums[ngram] / len(ngram) ** 0.5, ngram) for ngram, count in counts.items()]
+    # Only the head of the ranking is needed; widen to a full sort if dedup exhausts it
+    limit = top_n * 4
+    keywords = _select(heapq.nsmallest(limit, scored), top_n)
+    if len(keywords) < top_n and len(scored) > limit:
+        keywords = _select(sorted(scored), top_n)
+    return keywords
+
+
+def _select(ranked, top_n: int) -> list[str]:
+    keywords: list[str] = []
+    for _, ngram in ranked:
+        keyword = " ".join(ngram)
+        # Skip phrases that repeat or are contained in a better-ranked keyword
+        if any(f" {keyword} " in f" {kept} " or f" {kept} " in f" {keyword} " for kept in keywords):
+            continue
+        keywords.append(keyword)
+        if len(keywords) == top_n:
+            break
+    return keywords
+
+
+def extract_keywords(text: str, top_n: int = KEYWORDS_TOP_N, corpus: BackgroundCorpus | None = None) -> list[str]:
+    """Top keywords of one description, scored against the background corpus."""
+    corpus = corpus or background_corpus
+    counts = candidates(tokenize(text or ""))
+    idf = {word: corpus.idf(word) for ngram in counts for word in ngram}
+    return _rank(counts, idf, top_n)
+
+
+def extract_keywords_batch(
+    texts: list[str], top_n: int = KEYWORDS_TOP_N, corpus: BackgroundCorpus | None = None
+) -> list[list[str]]:
+    """Keywords for many descriptions, scored against the corpus plus the batch itself.
+
+    The batch's own document frequencies are added to the background corpus
+    so terms shared by every description in it are down-weighted too. IDF
+    values and phrase weights are computed once per batch, so phrases that
+    recur across descriptions are only scored once.
+    """
+    corpus = corpus or background_corpus
+    all_tokens = [tokenize(text or "") for text in texts]
+    batch_df = Counter()
+    for tokens in all_tokens:
+        batch_df.update(set(tokens))
+    del batch_df[None]
+    idf = {word: corpus.idf(word, len(texts), batch_df) for word in batch_df}
+    idf_sums: dict = {}
+    return [_rank(candidates(tokens), idf, top_n, idf_sums) for tokens in all_tokens]
+
+
+def build_corpus(texts, corpus: BackgroundCorpus | None = None) -> BackgroundCorpus:
+    """Adds each description's words to a corpus (a new one by default)."""
+    corpus = corpus or BackgroundCorpus()
+    for text in texts:
+        corpus.add_document(word for word in tokenize(text or "") if word)
+    return corpus
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Build a keyword background corpus from descriptions")
+    parser.add_argument("output", help="Corpus JSON to write (use as KEYWORDS_CORPUS_PATH)")
+    parser.add_argument("inputs", nargs="*", help="Text files with one description per line (default: stdin)")
+    args = parser.parse_args()
+
+    corpus = BackgroundCorpus()
+    for path in args.inputs or ["-"]:
+        if path == "-":
+            build_corpus((line for line in sys.stdin if line.strip()), corpus)
+            continue
+        with open(path, encoding="utf-8") as f:
+            build_corpus((line for line in f if line.strip()), corpus)
+    corpus.dump(args.output)
+    print(f"{corpus.documents} documents, {len(corpus.df)} terms -> {args.output}")
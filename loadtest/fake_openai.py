@@ -0,0 +1,101 @@
+"""Local OpenAI-compatible chat completions stub.
+
+    FAKE_OPENAI_LATENCY_MS=2000 uvicorn loadtest.fake_openai:app --port 8102
+
+Returns a canned ASO analysis after a configurable delay, as a single
+completion or, with stream=True, as SSE chunks spread over the same delay.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LATENCY_MS = float(os.getenv("FAKE_OPENAI_LATENCY_MS", "1500"))
+JITTER_MS = float(os.getenv("FAKE_OPENAI_JITTER_MS", "500"))
+STREAM_CHUNKS = int(os.getenv("FAKE_OPENAI_STREAM_CHUNKS", "40"))
+
+ANALYSIS = {
+    "keywords": ["planner", "habit tracker", "daily goals", "to do list", "productivity", "reminders", "calendar", "focus"],
+    "keyword_suggestions": ["habit app", "goal setting", "task manager", "daily routine", "time management"],
+    "title": "Bench Planner: Habits & Goals",
+    "short_description": "Plan your day, build habits and hit your goals with smart reminders.",
+    "long_description": "Bench Planner helps you organise every day. " * 60,
+    "rank_time_estimate": "4-6 weeks",
+    "review_suggestions": [
+        "Great planner, keeps me on track!",
+        "The habit tracker changed my mornings.",
+        "Simple, fast and beautifully designed.",
+        "Reminders are spot on.",
+        "Best productivity app I have tried.",
+    ],
+}
+
+app = FastAPI()
+
+
+def _delay() -> float:
+    return max(0.0, LATENCY_MS + random.uniform(-JITTER_MS, JITTER_MS)) / 1000
+
+
+def _usage(body: dict, content: str) -> dict:
+    prompt_chars = sum(len(str(m.get("content", ""))) for m in body.get("messages", []))
+    prompt_tokens, completion_tokens = prompt_chars // 4, len(content) // 4
+    # Mimic OpenAI prefix caching: a leading system message of 1024+ tokens is
+    # served from cache in 128-token increments
+    messages = body.get("messages") or [{}]
+    prefix_tokens = len(str(messages[0].get("content", ""))) // 4 if messages[0].get("role") == "system" else 0
+    cached_tokens = prefix_tokens // 128 * 128 if prefix_tokens >= 1024 else 0
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached_tokens},
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "gpt-4o")
+    content = json.dumps(ANALYSIS)
+    created = int(time.time())
+
+    if not body.get("stream"):
+        await asyncio.sleep(_delay())
+        return JSONResponse({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": _usage(body, content),
+        })
+
+    async def events():
+        step = max(1, len(content) // STREAM_CHUNKS)
+        pause = _delay() / STREAM_CHUNKS
+        for start in range(0, len(content), step):
+            await asyncio.sleep(pause)
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": content[start:start + step]}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+        final = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        }
+        yield f"data: {json.dumps(final)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
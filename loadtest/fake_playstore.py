@@ -0,0 +1,41 @@
+"""Local stand-in for play.google.com listing pages.
+
+    FAKE_PLAYSTORE_LATENCY_MS=150 uvicorn loadtest.fake_playstore:app --port 8101
+
+Serves recorded fixtures from benchmarks/fixtures when present (picked by
+package ID), otherwise a synthetic page per package ID so every app has
+distinct content.
+"""
+import asyncio
+import os
+import random
+import zlib
+from functools import lru_cache
+
+from fastapi import FastAPI, Query
+from fastapi.responses import Response
+
+from benchmarks.fixtures import recorded_corpus
+from benchmarks.synthetic import LOCALES, synthetic_page
+
+LATENCY_MS = float(os.getenv("FAKE_PLAYSTORE_LATENCY_MS", "100"))
+JITTER_MS = float(os.getenv("FAKE_PLAYSTORE_JITTER_MS", "50"))
+PAGE_SIZE = os.getenv("FAKE_PLAYSTORE_PAGE_SIZE", "typical")
+
+app = FastAPI()
+recorded_pages = list(recorded_corpus().values())
+
+
+@lru_cache(maxsize=4096)
+def page_for(package_id: str, hl: str) -> bytes:
+    seed = zlib.crc32(package_id.encode())
+    if recorded_pages:
+        return recorded_pages[seed % len(recorded_pages)]
+    return synthetic_page(hl if hl in LOCALES else "en", PAGE_SIZE, seed % 100_000)
+
+
+@app.get("/store/apps/details")
+async def details(id: str = Query(...), hl: str = Query("en")):
+    await asyncio.sleep(max(0.0, LATENCY_MS + random.uniform(-JITTER_MS, JITTER_MS)) / 1000)
+    page = page_for(id, hl)
+    return Response(page, media_type="text/html; charset=utf-8")
@@ -0,0 +1,186 @@
+"""Offline end-to-end load test for /scrape.
+
+    python -m loadtest.run --concurrency 50 --requests 2000
+    python -m loadtest.run --target http://127.0.0.1:8000 --playstore http://127.0.0.1:8101
+
+Starts the fake Play Store, the fake OpenAI server and the app itself as
+uvicorn subprocesses wired together through env vars (the app reaches the
+stub via OPENAI_BASE_URL, and is handed listing URLs on the fake Play Store),
+then drives the endpoint at the requested concurrency and reports throughput
+and latency percentiles. Nothing leaves the machine.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def start_server(module: str, port: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", module, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_ROOT,
+        env={**os.environ, **env},
+    )
+
+
+def wait_until_up(base_url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(base_url + "/docs", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{base_url} did not come up within {timeout}s")
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+async def drive(args) -> dict:
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    next_request = 0
+    deadline = time.monotonic() + args.duration if args.duration else None
+
+    def take() -> int | None:
+        nonlocal next_request
+        if deadline is not None:
+            if time.monotonic() >= deadline:
+                return None
+        elif next_request >= args.requests:
+            return None
+        next_request += 1
+        return next_request - 1
+
+    async def worker(client: httpx.AsyncClient):
+        while (i := take()) is not None:
+            listing = f"{args.playstore}/store/apps/details?id=com.example.load{i % args.apps}&hl=en"
+            params = {"url": listing}
+            if not args.use_cache:
+                params["bypass_cache"] = "true"
+            if args.analysis:
+                params["analysis"] = args.analysis
+            start = time.perf_counter()
+            try:
+                response = await client.get(args.target + args.endpoint, params=params)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = e.__class__.__name__
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[status] += 1
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=args.request_timeout) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ok = statuses.get("200", 0)
+    return {
+        "requests": len(latencies),
+        "ok": ok,
+        "statuses": dict(statuses),
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(ok / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 1),
+            "p95": round(percentile(latencies, 95), 1),
+            "p99": round(percentile(latencies, 99), 1),
+            "max": round(latencies[-1], 1) if latencies else 0.0,
+        },
+    }
+
+
+def report(results: dict):
+    latency = results["latency_ms"]
+    print(f"requests:   {results['requests']} ({results['ok']} ok) statuses={results['statuses']}")
+    print(f"duration:   {results['duration_s']} s")
+    print(f"throughput: {results['throughput_rps']} req/s")
+    print(f"latency ms: p50={latency['p50']} p95={latency['p95']} p99={latency['p99']} max={latency['max']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end load test for /scrape")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=1000, help="Total requests (ignored with --duration)")
+    parser.add_argument("--duration", type=float, help="Run for this many seconds instead of a fixed count")
+    parser.add_argument("--apps", type=int, default=100, help="Distinct package IDs to spread requests over")
+    parser.add_argument("--endpoint", default="/scrape")
+    parser.add_argument("--analysis", choices=("none", "lite", "full"), help="Analysis tier to request")
+    parser.add_argument("--use-cache", action="store_true", help="Let the app serve cached app data / analyses")
+    parser.add_argument("--request-timeout", type=float, default=120)
+    parser.add_argument("--target", help="Drive an already running app instead of starting one")
+    parser.add_argument("--playstore", help="Use an already running fake Play Store")
+    parser.add_argument("--app-port", type=int, default=8100)
+    parser.add_argument("--playstore-port", type=int, default=8101)
+    parser.add_argument("--openai-port", type=int, default=8102)
+    parser.add_argument("--playstore-latency-ms", type=float, default=100)
+    parser.add_argument("--openai-latency-ms", type=float, default=1500)
+    parser.add_argument("--json", type=Path, help="Also write results to this file")
+    parser.add_argument("--min-throughput", type=float, help="Exit non-zero below this many ok req/s")
+    parser.add_argument("--max-p99-ms", type=float, help="Exit non-zero if p99 latency exceeds this")
+    args = parser.parse_args()
+
+    processes = []
+    try:
+        if not args.playstore:
+            args.playstore = f"http://127.0.0.1:{args.playstore_port}"
+            processes.append(start_server("loadtest.fake_playstore:app", args.playstore_port, {
+                "FAKE_PLAYSTORE_LATENCY_MS": str(args.playstore_latency_ms),
+            }))
+            wait_until_up(args.playstore)
+        if not args.target:
+            openai_url = f"http://127.0.0.1:{args.openai_port}"
+            processes.append(start_server("loadtest.fake_openai:app", args.openai_port, {
+                "FAKE_OPENAI_LATENCY_MS": str(args.openai_latency_ms),
+            }))
+            wait_until_up(openai_url)
+            args.target = f"http://127.0.0.1:{args.app_port}"
+            cache_dir = tempfile.mkdtemp(prefix="aso-loadtest-")
+            processes.append(start_server("main:app", args.app_port, {
+                "OPENAI_API_KEY": "loadtest",
+                "OPENAI_BASE_URL": openai_url + "/v1",
+                "ANALYSIS_CACHE_PATH": os.path.join(cache_dir, "analysis_cache.sqlite3"),
+            }))
+            wait_until_up(args.target)
+
+        results = asyncio.run(drive(args))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+    report(results)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2) + "\n")
+
+    failures = []
+    if args.min_throughput is not None and results["throughput_rps"] < args.min_throughput:
+        failures.append(f"throughput {results['throughput_rps']} < {args.min_throughput} req/s")
+    if args.max_p99_ms is not None and results["latency_ms"]["p99"] > args.max_p99_ms:
+        failures.append(f"p99 {results['latency_ms']['p99']} > {args.max_p99_ms} ms")
+    if failures:
+        print("FAILED: " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
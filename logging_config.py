@@ -0,0 +1,163 @@
+"""Structured, non-blocking application logging with per-request IDs.
+
+Records from the "aso" logger tree go onto a bounded in-memory queue and are
+formatted and written to stdout by a single background listener thread, so
+request handlers never block on stdout. Records are dropped (and counted)
+rather than blocking if the queue fills up.
+"""
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json | text
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Large payloads (e.g. full scrape results) are only logged for a sample of requests
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "2000"))
+
+REQUEST_ID_HEADER = "X-Request-ID"
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+request_id_var: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+logger = logging.getLogger("aso")
+
+_RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that tags records with the request ID and never blocks."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only the cheap parts run on the caller's thread: merge args, capture
+        # the traceback text and the request ID. Formatting happens on the listener.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if getattr(record, "request_id", None) is None:
+            record.request_id = request_id_var.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: logging.handlers.QueueListener | None = None
+_queue_handler: DroppingQueueHandler | None = None
+
+
+def configure_logging():
+    """Attaches the queue handler to the "aso" logger and starts the writer thread."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.addHandler(_queue_handler)
+    logger.propagate = False
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flushes queued records and stops the writer thread."""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    _listener.stop()
+    logger.removeHandler(_queue_handler)
+    _listener = _queue_handler = None
+
+
+def dropped_records() -> int:
+    return _queue_handler.dropped if _queue_handler else 0
+
+
+def log_payload(log: logging.Logger, message: str, payload, level: int = logging.DEBUG, **fields):
+    """Logs a sampled, truncated JSON rendering of a large payload.
+
+    The payload is only serialised when the level is enabled and the record
+    is sampled, so unsampled requests pay nothing.
+    """
+    if not log.isEnabledFor(level) or random.random() >= LOG_PAYLOAD_SAMPLE_RATE:
+        return
+    text = json.dumps(payload, default=str, ensure_ascii=False)
+    log.log(level, message, extra={
+        **fields,
+        "payload": text[:LOG_PAYLOAD_MAX_CHARS],
+        "payload_chars": len(text),
+        "payload_truncated": len(text) > LOG_PAYLOAD_MAX_CHARS,
+    })
+
+
+class RequestIdMiddleware:
+    """ASGI middleware giving each request an ID (incoming X-Request-ID or a new one)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = next((value.decode("latin-1") for name, value in scope["headers"] if name == b"x-request-id"), "")
+        request_id = incoming if _VALID_REQUEST_ID.match(incoming) else uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (REQUEST_ID_HEADER.lower().encode(), request_id.encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
@@ -1,19 +1,137 @@
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import JSONResponse
-import requests
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+import httpx
 from fastapi.middleware.cors import CORSMiddleware
-from bs4 import BeautifulSoup
-from openai import OpenAI
-from pydantic import BaseModel
+from openai import AsyncOpenAI
+from pydantic import AnyHttpUrl, BaseModel
 import os
 import json
+import time
+from typing import Literal
+
+from admission import (
+    AdmissionController,
+    AdmittedStreamingResponse,
+    ClientDisconnected,
+    Overloaded,
+    cancel_on_disconnect,
+)
+from cache import (
+    AnalysisCache,
+    AppDataCache,
+    AppDataEntry,
+    EncodedResponse,
+    ResponseCache,
+    analysis_cache_key,
+    app_cache_key,
+    encode_response,
+    etag_matches,
+    listing_locale,
+    negotiate_encoding,
+)
+from deadline import DEADLINE_FETCH_SHARE, Deadline, deadline_var
+from extractor import NOT_AVAILABLE, IncrementalExtractor, extract_app_data
+from hedge import Hedger
+from fetcher import (
+    INCREMENTAL_FETCH,
+    close_http_client,
+    fetch_playstore_page,
+    fetch_stats,
+    get_http_client,
+    stream_playstore_page,
+)
+from jobs import Job, JobManager, JobQueueFull
+from keywords import extract_keywords, local_keywords_for
+from logging_config import (
+    RequestIdMiddleware,
+    configure_logging,
+    dropped_records,
+    log_payload,
+    logger,
+    shutdown_logging,
+)
+from metrics import (
+    MetricsMiddleware,
+    count_stage_error,
+    observe_stage,
+    record_stage,
+    record_token_usage,
+    registry,
+    token_usage,
+)
+from prompts import (
+    DESCRIPTION_COMPACTION,
+    DESCRIPTION_TOKEN_BUDGET,
+    FULL_ANALYSIS,
+    PROMPT_VERSION,
+    analysis_subtasks,
+    build_analysis_messages,
+    estimate_request_tokens,
+    resolve_analysis_fields,
+)
+from ratelimit import LaneQueueFull, RateLimitScheduler, flight_var, priority_var
+from singleflight import SingleFlight
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging()
+    # One pooled HTTP client for the whole app lifetime
+    get_http_client()
+    job_manager.start()
+    yield
+    await job_manager.stop()
+    await close_http_client()
+    await client.close()
+    analysis_cache.close()
+    shutdown_logging()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 # Load API key from environment variable (recommended for security)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-# Initialize OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Point at an OpenAI-compatible server instead of api.openai.com (e.g. the load-test stub)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+# Upper bound on a single completion, whatever the request deadline
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+# Initialize OpenAI client, shared by all requests. No SDK retries: 429s are
+# re-queued by openai_scheduler, which pauses admission while they last
+client = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, timeout=OPENAI_TIMEOUT, max_retries=0)
+OPENAI_MODEL = "gpt-4o"
+# Every completion waits here for a concurrency slot and RPM / TPM budget
+openai_scheduler = RateLimitScheduler()
+# API keys pinned to a priority lane, e.g. "nightly-refresh-key=bulk,dashboard-key=interactive"
+PRIORITY_API_KEYS = dict(
+    item.strip().split("=", 1) for item in os.getenv("PRIORITY_API_KEYS", "").split(",") if "=" in item
+)
+# Split the analysis into concurrent sub-task completions (see prompts.ANALYSIS_SUBTASKS)
+ANALYSIS_FANOUT = os.getenv("ANALYSIS_FANOUT", "false").lower() in ("1", "true", "yes")
+
+# Batch scraping limits
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "32"))
+BATCH_MAX_URLS = int(os.getenv("BATCH_MAX_URLS", "500"))
+
+# Scraped app_data keyed by package ID + locale
+app_data_cache = AppDataCache()
+# analysis_result keyed by content hash, persisted across restarts
+analysis_cache = AnalysisCache()
+# Encoded /scrape bodies served with ETag / 304 support
+response_cache = ResponseCache()
+# Concurrent requests for the same app share one fetch and one LLM call,
+# cancelled once every client waiting on it has disconnected. A finished
+# analysis drops any lane promotion its joiners gave it
+fetch_flights = SingleFlight(cancel_abandoned=True)
+analysis_flights = SingleFlight(cancel_abandoned=True, on_done=openai_scheduler.forget)
+# Caps how many /scrape requests run and queue at once
+admission = AdmissionController()
+# Duplicate Play Store fetches and completions that run past their p95 (see HEDGE_STAGES)
+fetch_hedger = Hedger("fetch")
+openai_hedger = Hedger("openai")
 
 
 # Initia
@@ -24,117 +142,735 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Request-ID", "ETag", "Retry-After"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestIdMiddleware)
 
 
-def scrape_playstore_app_data(url: str):
-    """Scrapes data from a Google Play Store app URL."""
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
-    
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
-        return {"error": f"Failed to retrieve data for URL: {url}"}
-    
-    soup = BeautifulSoup(response.content, 'html.parser')
-    app_data = {}
-    analysis_result = {}
-    
-    def get_text_or_default(soup_element, default="Not Available"):
-        return soup_element.text.strip() if soup_element else default
-    
+def parse_analysis(content: str) -> dict:
+    """Parses the completion text, which must be a single JSON object."""
+    result = json.loads(content)
+    if not isinstance(result, dict):
+        raise ValueError("Analysis response is not a JSON object")
+    return result
+
+
+async def analyze_app_data(app_data: dict, fields: tuple = FULL_ANALYSIS):
+    """Runs the gpt-4o ASO analysis for the scraped app_data."""
+    messages = build_analysis_messages(app_data, fields)
+    completion = await openai_hedger.run(
+        lambda: openai_scheduler.call(
+            estimate_request_tokens(messages, fields),
+            lambda: client.chat.completions.with_raw_response.create(
+                model=OPENAI_MODEL,
+                messages=messages,
+                response_format={"type": "json_object"}  # ✅ Enforces pure JSON output
+            ),
+        ),
+        key=",".join(fields),
+        # Only hedge with a free slot, never ahead of queued calls
+        when=lambda: not openai_scheduler.queued and openai_scheduler.in_flight < openai_scheduler.max_concurrency,
+    )
+    record_token_usage(completion.usage)
+    # Parse the JSON string into a Python dictionary
+    return parse_analysis(completion.choices[0].message.content)
+
+
+async def fan_out_analysis(app_data: dict, fields: tuple = FULL_ANALYSIS) -> dict:
+    """Runs one completion per sub-task concurrently and merges them into one analysis_result."""
+    groups = analysis_subtasks(fields)
+    tasks = [asyncio.ensure_future(analyze_app_data(app_data, group)) for group in groups]
     try:
-        app_data['Name'] = get_text_or_default(soup.find('title'))
-        app_data['Developer URL'] = soup.find('meta', attrs={'name': 'appstore:developer_url'}).get('content', 'Not Available') # type: ignore
-        app_data['Bundle ID'] = soup.find('meta', attrs={'name': 'appstore:bundle_id'}).get('content', 'Not Available') # type: ignore
-        app_data['Description'] = get_text_or_default(soup.find('div', class_='bARER'))
-        rating_value = soup.find('div', class_='jILTFe')
-        rating_value_text = rating_value.text.strip() if rating_value else 'Not Available'
-        app_data['Rating'] = rating_value_text  #get_text_or_default(rating_value)
-        # Extract the rating description from the aria-label attribute
-        aria_label_div = soup.find('div', class_='I26one')
-        if aria_label_div and 'aria-label' in aria_label_div.attrs: # type: ignore
-            rating_description_text = aria_label_div['aria-label'] # type: ignore
-        else:
-            rating_description_text = 'Not Available'
-        app_data['Rating Description'] = rating_description_text  # aria_label_div['aria-label'] if aria_label_div and 'aria-label' in aria_label_div.attrs else 'Not Available'
-    
-        app_data['Number of Reviews'] = get_text_or_default(soup.find('div', class_='g1rdde'))
-        app_data['Number of Downloads'] = soup.find_all('div', class_='ClM7O')[1].text.strip() if len(soup.find_all('div', class_='ClM7O')) > 1 else 'Not Available'
-        developer = soup.find('div', class_='Vbfug auoIOc')
-        app_data['Developer'] = developer.find('span').text.strip() if developer and developer.find('span') else 'Not Available' # type: ignore
-        app_data['Price'] = get_text_or_default(soup.find('span', class_='VfPp2b'), default='Free')
-    except Exception as e:
-        return {"error": f"Error extracting data: {str(e)}"}
-    
-    
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        # One failed sub-task fails the analysis; stop paying for the others
+        for task in tasks:
+            task.cancel()
+        raise
+    merged = {}
+    for group, result in zip(groups, results):
+        merged.update((name, result[name]) for name in group if name in result)
+    # Keep the field order of the single-call response
+    return {name: merged[name] for name in fields if name in merged}
+
+
+async def stream_analysis(app_data: dict, fields: tuple = FULL_ANALYSIS):
+    """Same request as analyze_app_data with stream=True; yields content deltas."""
+    messages = build_analysis_messages(app_data, fields)
+
+    def request():
+        return client.chat.completions.with_raw_response.create(
+            model=OPENAI_MODEL,
+            messages=messages,
+            response_format={"type": "json_object"},
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+
+    # The slot stays held until the stream is fully consumed
+    async with openai_scheduler.open(estimate_request_tokens(messages, fields), request) as stream:
+        async for chunk in stream:
+            # Usage arrives on a final chunk with no choices
+            if chunk.usage:
+                record_token_usage(chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class ScrapeError(Exception):
+    """Listing could not be fetched or parsed; reported as an error payload."""
+
+
+async def get_app_data(url: str, bypass_cache: bool = False) -> dict:
+    """Returns app_data for a listing, served from the cache when fresh."""
+    key = app_cache_key(url)
+    entry, fresh = (None, False) if bypass_cache else app_data_cache.lookup(key)
+    if fresh:
+        return entry.app_data
+    deadline = deadline_var.get()
     try:
-        completion = client.chat.completions.create(
-    model="gpt-4o",
-    messages=[
-        {
-            "role": "user",
-            "content": """Act as a Google App Store Optimization (ASO) expert. Analyze the given app data and provide an optimized response in **pure JSON format**.
-
-            ### **App Data:**"""+
-            
-           f"{app_data}"+
-
-           """ ### **Strict Output Requirements:**
-            - The output **must** be **a valid JSON object** (no markdown, no extra text, no `\n` characters).
-            - **Do not** use triple backticks (` ```json `) or any special formatting.
-            - The JSON must contain the following fields:
-              - `keywords`: List of target keywords in the app description (minimum 8-10 keywords).
-              - `keyword_suggestions`: List of additional keyword suggestions (minimum 5-10 keywords)..
-              - `title`: ASO-optimized relevant title (max 30 characters).
-              - `short_description`: Optimized relevant short description (max 80 characters).
-              - `long_description`: Optimized relevant long description (min 2500 characters and max 3000 characters).
-              - `rank_time_estimate`: Estimated improvement timeframe.
-              - `review_suggestions`: List of review sentence suggestions (at least 5).
-
-            ### **JSON Format Example:**
-            {
-              "keywords": [],
-              "keyword_suggestions": [],
-              "title": "ASO-optimized title (max 30 characters)",
-              "short_description": "Short Description text (max 80 characters)s",
-              "long_description": "Long Description text (min 2500 characters and max 3000 characters)",
-              "rank_time_estimate": "",
-              "review_suggestions": [],
-            }
-
-            Strictly return the response **as a JSON object only**, without any additional formatting or text.
-            """
-                    }
-                ],
-                response_format={"type": "json_object"}  # ✅ Enforces pure JSON output
+        return await fetch_flights.do(
+            key,
+            lambda: _fetch_app_data(url, key, entry),
+            timeout=deadline.budget(DEADLINE_FETCH_SHARE) if deadline else None,
         )
+    except asyncio.TimeoutError:
+        count_stage_error("fetch")
+        raise HTTPException(status_code=504, detail=f"Deadline exceeded retrieving data for URL: {url}")
 
 
-        # return app_data
-        # print(completion.choices[0].message.content)
-        
-        # Parse the JSON string into a Python dictionary
-        new_response = json.loads(completion.choices[0].message.content)
+async def _download_incremental(url: str, headers: dict | None) -> tuple[httpx.Response, dict | None, float]:
+    """Streams the page through the extractor, hanging up once every field is found.
+
+    Also returns the seconds spent parsing, which overlap with the download.
+    """
+    parse_seconds = 0.0
+    async with stream_playstore_page(url, headers) as response:
+        if response.status_code != 200:
+            fetch_stats.record(response)
+            return response, None, parse_seconds
+        parser = IncrementalExtractor()
+        early = False
+        try:
+            async for chunk in response.aiter_bytes():
+                # Parsing runs off the event loop
+                parse_start = time.perf_counter()
+                await run_in_threadpool(parser.feed, chunk)
+                parse_seconds += time.perf_counter() - parse_start
+                if parser.complete:
+                    early = True
+                    break
+            else:
+                parse_start = time.perf_counter()
+                await run_in_threadpool(parser.finish)
+                parse_seconds += time.perf_counter() - parse_start
+        except httpx.HTTPError:
+            raise
+        except Exception as e:
+            count_stage_error("parse")
+            raise ScrapeError(f"Error extracting data: {str(e)}")
+        fetch_stats.record(response, early)
+        return response, parser.result(), parse_seconds
+
+
+async def _fetch_incremental(url: str, headers: dict | None) -> tuple[httpx.Response, dict | None]:
+    """_download_incremental behind the hedger, timed once however many attempts it took."""
+    start = time.perf_counter()
+    parse_seconds = 0.0
+    try:
+        response, app_data, parse_seconds = await fetch_hedger.run(lambda: _download_incremental(url, headers))
+        return response, app_data
+    except httpx.HTTPError:
+        count_stage_error("fetch")
+        raise
+    finally:
+        # Download and parsing interleave; split the wall time between the two stages
+        record_stage("fetch", time.perf_counter() - start - parse_seconds)
+        if parse_seconds:
+            record_stage("parse", parse_seconds)
+
+
+async def _fetch_app_data(url: str, key: str, entry: AppDataEntry | None) -> dict:
+    headers = entry.conditional_headers() if entry else None
+    try:
+        if INCREMENTAL_FETCH:
+            response, app_data = await _fetch_incremental(url, headers)
+        else:
+            with observe_stage("fetch"):
+                response = await fetch_hedger.run(lambda: fetch_playstore_page(url, headers=headers))
+            app_data = None
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=504, detail=f"Timed out retrieving data for URL: {url}")
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Failed to retrieve data for URL: {url} ({e})")
+    if response.status_code == 304 and entry:
+        return app_data_cache.mark_revalidated(key, entry).app_data
+    if response.status_code != 200:
+        count_stage_error("fetch")
+        raise ScrapeError(f"Failed to retrieve data for URL: {url}")
+
+    if app_data is None:
+        # Parsing runs off the event loop
+        try:
+            with observe_stage("parse"):
+                app_data = await run_in_threadpool(extract_app_data, response.content)
+        except Exception as e:
+            raise ScrapeError(f"Error extracting data: {str(e)}")
+    app_data_cache.store(key, app_data, response.headers.get("etag"), response.headers.get("last-modified"))
+    return app_data
+
+
+def analysis_fields(analysis: str = "full", fields: str | list[str] | None = None) -> tuple:
+    """resolve_analysis_fields, reporting bad selections as a 422."""
+    try:
+        return resolve_analysis_fields(analysis, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+def _analysis_key(app_data: dict, fields: tuple, local_keywords: bool = False) -> str:
+    version = PROMPT_VERSION if fields == FULL_ANALYSIS else f"{PROMPT_VERSION}:{','.join(fields)}"
+    # The model sees the compacted description, so its settings are part of the prompt
+    version += f"+description:{DESCRIPTION_TOKEN_BUDGET}" if DESCRIPTION_COMPACTION else "+description:raw"
+    if local_keywords and "keywords" in fields:
+        # Entries with LLM keywords must not be served as local ones, or the other way round
+        version += "+local-keywords"
+    return analysis_cache_key(app_data, version, OPENAI_MODEL)
+
+
+async def _cached_analysis(app_data: dict, fields: tuple, local_keywords: bool = False) -> dict | None:
+    """Cached analysis covering fields, cut down from a cached full analysis if needed."""
+    cached = await run_in_threadpool(analysis_cache.get, _analysis_key(app_data, fields, local_keywords))
+    if cached is None and fields != FULL_ANALYSIS:
+        full = await run_in_threadpool(analysis_cache.get, _analysis_key(app_data, FULL_ANALYSIS, local_keywords))
+        if full is not None and all(name in full for name in fields):
+            cached = {name: full[name] for name in fields}
+    return cached
+
+
+async def get_analysis(
+    app_data: dict, bypass_cache: bool = False, fields: tuple = FULL_ANALYSIS, local_keywords: bool = False
+) -> dict:
+    """Returns the analysis for app_data, reusing a cached one for identical input.
+
+    `local_keywords` computes the keywords field locally instead of asking the
+    LLM (see local_keywords_for). Raises asyncio.TimeoutError when the request
+    deadline runs out first; the analysis keeps running and lands in the cache
+    for the next request.
+    """
+    if not bypass_cache:
+        cached = await _cached_analysis(app_data, fields, local_keywords)
+        if cached is not None:
+            return cached
+    key = _analysis_key(app_data, fields, local_keywords)
+    if analysis_flights.running(key):
+        # The shared analysis runs in the lane of whoever started it; don't let
+        # an interactive caller wait behind a bulk queue for it
+        openai_scheduler.promote(key)
+    deadline = deadline_var.get()
+    return await analysis_flights.do(
+        key,
+        lambda: _run_analysis(app_data, key, fields, local_keywords),
+        timeout=deadline.remaining() if deadline else None,
+    )
+
+
+def set_priority(request: Request, priority: str | None, default: str) -> str:
+    """Puts the rest of this request in a priority lane.
+
+    A lane pinned to the caller's X-API-Key wins over the requested one,
+    which wins over the endpoint default. An unknown lane is rejected with a 422.
+    """
+    if priority is not None and priority not in openai_scheduler.lane_weights:
+        lanes = ", ".join(openai_scheduler.lane_weights)
+        raise HTTPException(status_code=422, detail=f"Unknown priority lane {priority!r}; expected one of: {lanes}")
+    lane = openai_scheduler.lane(PRIORITY_API_KEYS.get(request.headers.get("x-api-key", "")) or priority or default)
+    priority_var.set(lane)
+    return lane
+
+
+def _llm_fields(fields: tuple, local_keywords: bool) -> tuple:
+    """The requested fields that still need the LLM."""
+    return tuple(name for name in fields if not (local_keywords and name == "keywords"))
+
+
+def _add_local_fields(app_data: dict, fields: tuple, result: dict, local_keywords: bool) -> dict:
+    """Fills in the locally computed fields and restores the requested field order."""
+    if local_keywords and "keywords" in fields:
+        description = app_data.get("Description", "")
+        with observe_stage("keywords"):
+            keywords = extract_keywords(description) if description != NOT_AVAILABLE else []
+        result = {**result, "keywords": keywords}
+    return {name: result[name] for name in fields if name in result}
+
+
+async def _run_analysis(app_data: dict, key: str, fields: tuple = FULL_ANALYSIS, local_keywords: bool = False) -> dict:
+    llm_fields = _llm_fields(fields, local_keywords)
+    result = {}
+    if llm_fields:
+        flight_var.set(key)
+        with observe_stage("llm"):
+            if ANALYSIS_FANOUT:
+                result = await fan_out_analysis(app_data, llm_fields)
+            else:
+                result = await analyze_app_data(app_data, llm_fields)
+    result = _add_local_fields(app_data, fields, result, local_keywords)
+    await run_in_threadpool(analysis_cache.put, key, result, OPENAI_MODEL, PROMPT_VERSION)
+    return result
+
+
+async def scrape_playstore_app_data(url: str, bypass_cache: bool = False, fields: tuple = FULL_ANALYSIS):
+    """Scrapes data from a Google Play Store app URL."""
+    try:
+        app_data = await get_app_data(url, bypass_cache)
+    except ScrapeError as e:
+        logger.warning("scrape failed", extra={"url": url, "error": str(e)})
+        return {"error": str(e)}
+    if not fields:
+        return {"app_data": app_data}
+
+    try:
+        new_response = await get_analysis(app_data, bypass_cache, fields, local_keywords_for(listing_locale(url)))
 
         # Merge the two dictionaries
         combined_data = {}
         combined_data['app_data']=app_data
         combined_data['analysis_result']=new_response #completion.choices[0].message.content
-        # Convert back to JSON format (for response)
-        analysis_result = json.dumps(combined_data, indent=2)
-        print(combined_data)
-        
+
+    except asyncio.TimeoutError:
+        # Out of time: answer with what we have rather than nothing
+        logger.warning("analysis deadline exceeded", extra={"url": url})
+        count_stage_error("llm")
+        return {"app_data": app_data, "analysis_result": None, "analysis_status": "pending"}
+    except LaneQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
+        logger.exception("analysis failed", extra={"url": url})
         raise HTTPException(status_code=500, detail=str(e))
-    
-    return JSONResponse(content=combined_data)    
-    
+
+    logger.info("scrape complete", extra={"url": url, "bundle_id": app_data.get("Bundle ID")})
+    log_payload(logger, "scrape result", combined_data, url=url)
+    return combined_data
+
+
+def _encoded_json_response(request: Request, encoded: EncodedResponse) -> Response:
+    """Serves pre-encoded bytes, answering 304 when the client already has them."""
+    headers = {"Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), encoded.etag):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers={**headers, "ETag": encoded.etag})
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""), encoded.variants)
+    headers["ETag"] = encoded.etag_for(encoding)
+    if encoding is None:
+        return Response(encoded.body, media_type="application/json", headers=headers)
+    headers["Content-Encoding"] = encoding
+    return Response(encoded.variants[encoding], media_type="application/json", headers=headers)
+
+
+async def _shed(request: Request, awaitable):
+    """Awaits admission-controlled work, shedding load with 503 + Retry-After.
+
+    Queued or running work is cancelled if the client disconnects.
+    """
+    try:
+        return await cancel_on_disconnect(request, awaitable)
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ClientDisconnected:
+        # Nobody will read this; it only shows up in the access log and metrics
+        raise HTTPException(status_code=499, detail="Client disconnected")
+
 
 @app.get("/scrape")
-def scrape_playstore(url: str = Query(..., title="Google Play Store App URL")):
-    return scrape_playstore_app_data(url)
+async def scrape_playstore(
+    request: Request,
+    url: str = Query(..., title="Google Play Store App URL"),
+    bypass_cache: bool = Query(False, title="Ignore cached app data and analysis"),
+    analysis: Literal["none", "lite", "full"] = Query("full", title="Analysis depth"),
+    fields: str | None = Query(None, title="Comma-separated analysis fields (overrides analysis)"),
+    priority: str | None = Query(None, title="Priority lane: interactive (default) or bulk"),
+    timeout_ms: int | None = Query(None, title="Deadline for the whole request in milliseconds"),
+):
+    deadline = Deadline.from_timeout_ms(timeout_ms)
+    deadline_var.set(deadline)
+    set_priority(request, priority, "interactive")
+    selected = analysis_fields(analysis, fields)
+    key = app_cache_key(url) if selected == FULL_ANALYSIS else f"{app_cache_key(url)}|{','.join(selected)}"
+    encoded = None if bypass_cache else response_cache.get(key)
+    if encoded is not None:
+        # Cached responses are cheap, so they skip admission control
+        return _encoded_json_response(request, encoded)
+
+    async def scrape():
+        # Queueing counts against the deadline too
+        async with admission.slot(deadline.remaining()):
+            combined_data = await scrape_playstore_app_data(url, bypass_cache, selected)
+        if "error" in combined_data or combined_data.get("analysis_status") == "pending":
+            # Errors and partial answers are not cached
+            return JSONResponse(content=combined_data)
+        with observe_stage("serialize"):
+            encoded = encode_response(combined_data)
+        response_cache.put(key, encoded)
+        return _encoded_json_response(request, encoded)
+
+    return await _shed(request, scrape())
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        "app_data": app_data_cache.stats(),
+        "analysis": await run_in_threadpool(analysis_cache.stats),
+        "response": response_cache.stats(),
+        "coalescing": {"fetch": fetch_flights.stats(), "analysis": analysis_flights.stats()},
+        "openai_tokens": token_usage(),
+    }
+
+
+@app.get("/fetch/stats")
+def fetch_statistics():
+    return fetch_stats.stats()
+
+
+@app.get("/openai/stats")
+def openai_statistics():
+    return openai_scheduler.stats()
+
+
+@app.get("/admission/stats")
+def admission_statistics():
+    return admission.stats()
+
+
+@app.get("/hedge/stats")
+def hedge_statistics():
+    return {"fetch": fetch_hedger.stats(), "openai": openai_hedger.stats()}
+
+
+def _collect_pipeline_metrics():
+    app_stats = app_data_cache.stats()
+    analysis_lookups = analysis_cache.hits + analysis_cache.misses
+    response_stats = response_cache.stats()
+    yield "aso_cache_lookups_total", "counter", "Cache lookups by result.", [
+        ({"cache": "response", "result": "hit"}, response_stats["hits"]),
+        ({"cache": "response", "result": "miss"}, response_stats["misses"]),
+        ({"cache": "response", "result": "not_modified"}, response_stats["not_modified"]),
+        ({"cache": "app_data", "result": "hit"}, app_stats["hits"]),
+        ({"cache": "app_data", "result": "miss"}, app_stats["misses"]),
+        ({"cache": "app_data", "result": "revalidated"}, app_stats["revalidated"]),
+        ({"cache": "analysis", "result": "hit"}, analysis_cache.hits),
+        ({"cache": "analysis", "result": "miss"}, analysis_cache.misses),
+    ]
+    yield "aso_cache_hit_ratio", "gauge", "Cache hit ratio since start.", [
+        ({"cache": "response"}, response_stats["hit_ratio"]),
+        ({"cache": "app_data"}, app_stats["hit_ratio"]),
+        ({"cache": "analysis"}, analysis_cache.hits / analysis_lookups if analysis_lookups else 0.0),
+    ]
+    yield "aso_cache_entries", "gauge", "Entries held in the in-memory caches.", [
+        ({"cache": "response"}, response_stats["size"]),
+        ({"cache": "app_data"}, app_stats["size"]),
+    ]
+    yield "aso_coalesced_calls_total", "counter", "Single-flight calls that started work vs joined one in flight.", [
+        ({"flight": name, "result": result}, flights.stats()[result])
+        for name, flights in (("fetch", fetch_flights), ("analysis", analysis_flights))
+        for result in ("started", "coalesced")
+    ]
+    yield "aso_fetch_bytes_total", "counter", "Listing bytes downloaded, and full page bytes where the size is known.", [
+        ({"kind": "downloaded"}, fetch_stats.bytes_downloaded),
+        ({"kind": "sized_downloaded"}, fetch_stats.sized_bytes_downloaded),
+        ({"kind": "sized_full_page"}, fetch_stats.sized_full_page_bytes),
+    ]
+    yield "aso_fetch_pages_total", "counter", "Listing pages fetched, by whether the download stopped early.", [
+        ({"early_terminated": "true"}, fetch_stats.early_terminated),
+        ({"early_terminated": "false"}, fetch_stats.pages - fetch_stats.early_terminated),
+    ]
+    yield "aso_openai_prompt_cache_ratio", "gauge", "Share of OpenAI prompt tokens served from the prompt cache.", [
+        ({}, token_usage()["prompt_cache_ratio"]),
+    ]
+    lane_stats = openai_scheduler.stats()["lanes"]
+    yield "aso_openai_queue_depth", "gauge", "OpenAI calls waiting for a scheduler slot, by priority lane.", [
+        ({"lane": lane}, stats["queued"]) for lane, stats in lane_stats.items()
+    ]
+    yield "aso_openai_lane_admissions_total", "counter", "OpenAI calls admitted or rejected (lane queue full), by lane.", [
+        ({"lane": lane, "result": result}, stats[result])
+        for lane, stats in lane_stats.items()
+        for result in ("admitted", "rejected")
+    ]
+    yield "aso_hedge_threshold_seconds", "gauge", "Latency after which a call is hedged, by stage and key.", [
+        ({"stage": hedger.stage, "key": key}, threshold)
+        for hedger in (fetch_hedger, openai_hedger)
+        for key, threshold in hedger.stats()["thresholds"].items()
+    ]
+    yield "aso_openai_in_flight", "gauge", "OpenAI calls currently running.", [({}, openai_scheduler.in_flight)]
+    admission_stats = admission.stats()
+    yield "aso_admission_in_flight", "gauge", "Scrape requests holding an admission slot.", [
+        ({}, admission_stats["in_flight"]),
+    ]
+    yield "aso_admission_queued", "gauge", "Scrape requests waiting for an admission slot.", [
+        ({}, admission_stats["queued"]),
+    ]
+    yield "aso_admission_requests_total", "counter", "Scrape requests by admission outcome.", [
+        ({"result": result}, admission_stats[result]) for result in ("admitted", "rejected", "timed_out", "abandoned")
+    ]
+    job_stats = job_manager.stats()
+    yield "aso_jobs", "gauge", "Background jobs held, by status.", [
+        ({"status": status}, count) for status, count in job_stats["jobs"].items()
+    ]
+    yield "aso_job_queue_depth", "gauge", "Background jobs waiting for a worker.", [({}, job_stats["queued"])]
+    yield "aso_log_records_dropped_total", "counter", "Log records dropped because the log queue was full.", [
+        ({}, dropped_records()),
+    ]
+
+
+registry.add_collector(_collect_pipeline_metrics)
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus text exposition of all metrics."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _close_stream(deltas, next_delta: asyncio.Future | None):
+    if next_delta is not None and not next_delta.done():
+        # An async generator can't be closed while a read is in progress
+        next_delta.cancel()
+        await asyncio.wait({next_delta})
+    await deltas.aclose()
+
+
+async def _finish_streamed_analysis(
+    app_data: dict, key: str, fields: tuple, local_keywords: bool, deltas, next_delta: asyncio.Future, parts: list
+) -> dict:
+    """Reads the rest of a streamed analysis nobody is waiting for and caches the result."""
+    try:
+        parts.append(await next_delta)
+        async for delta in deltas:
+            parts.append(delta)
+    except StopAsyncIteration:
+        pass
+    finally:
+        await _close_stream(deltas, next_delta)
+    result = _add_local_fields(app_data, fields, parse_analysis("".join(parts)), local_keywords)
+    await run_in_threadpool(analysis_cache.put, key, result, OPENAI_MODEL, PROMPT_VERSION)
+    return result
+
+
+async def _stream_scrape(url: str, bypass_cache: bool, fields: tuple = FULL_ANALYSIS):
+    try:
+        app_data = await get_app_data(url, bypass_cache)
+    except ScrapeError as e:
+        yield _sse("error", {"error": str(e)})
+        return
+    except HTTPException as e:
+        yield _sse("error", {"error": e.detail, "status_code": e.status_code})
+        return
+    yield _sse("app_data", app_data)
+    if not fields:
+        yield _sse("done", {})
+        return
+
+    local_keywords = local_keywords_for(listing_locale(url))
+    key = _analysis_key(app_data, fields, local_keywords)
+    cached = None if bypass_cache else await _cached_analysis(app_data, fields, local_keywords)
+    if cached is not None:
+        yield _sse("analysis_result", cached)
+        yield _sse("done", {})
+        return
+
+    llm_fields = _llm_fields(fields, local_keywords)
+    analysis_result = {}
+    parts = []
+    deadline = deadline_var.get()
+    try:
+        if llm_fields:
+            with observe_stage("llm"):
+                deltas = stream_analysis(app_data, llm_fields)
+                next_delta = None
+                try:
+                    while True:
+                        # asyncio.wait leaves the read running when the deadline passes
+                        next_delta = asyncio.ensure_future(deltas.__anext__())
+                        done, _ = await asyncio.wait({next_delta}, timeout=deadline.remaining() if deadline else None)
+                        if not done:
+                            # Finish the completion in the background so it lands in the cache,
+                            # unless the same analysis is already being computed
+                            if analysis_flights.start(
+                                key,
+                                lambda: _finish_streamed_analysis(
+                                    app_data, key, fields, local_keywords, deltas, next_delta, parts
+                                ),
+                            ):
+                                deltas = next_delta = None
+                            raise asyncio.TimeoutError()
+                        try:
+                            delta = next_delta.result()
+                        except StopAsyncIteration:
+                            break
+                        parts.append(delta)
+                        yield _sse("delta", {"content": delta})
+                finally:
+                    if deltas is not None:
+                        await _close_stream(deltas, next_delta)
+                analysis_result = parse_analysis("".join(parts))
+    except asyncio.TimeoutError:
+        yield _sse("analysis_pending", {"error": "Deadline exceeded before the analysis finished"})
+        yield _sse("done", {})
+        return
+    except LaneQueueFull as e:
+        yield _sse("error", {"error": str(e), "status_code": 503})
+        return
+    except Exception as e:
+        yield _sse("error", {"error": str(e), "status_code": 500})
+        return
+    analysis_result = _add_local_fields(app_data, fields, analysis_result, local_keywords)
+    await run_in_threadpool(analysis_cache.put, key, analysis_result, OPENAI_MODEL, PROMPT_VERSION)
+    yield _sse("analysis_result", analysis_result)
+    yield _sse("done", {})
+
+
+@app.get("/scrape/stream")
+async def scrape_playstore_stream(
+    request: Request,
+    url: str = Query(..., title="Google Play Store App URL"),
+    bypass_cache: bool = Query(False, title="Ignore cached app data and analysis"),
+    analysis: Literal["none", "lite", "full"] = Query("full", title="Analysis depth"),
+    fields: str | None = Query(None, title="Comma-separated analysis fields (overrides analysis)"),
+    priority: str | None = Query(None, title="Priority lane: interactive (default) or bulk"),
+    timeout_ms: int | None = Query(None, title="Deadline for the whole request in milliseconds"),
+):
+    """Server-Sent Events: app_data, then completion deltas, then the parsed analysis_result.
+
+    If the deadline runs out mid-analysis the stream ends with analysis_pending instead;
+    the completion keeps running and lands in the cache for the next request.
+    """
+    deadline = Deadline.from_timeout_ms(timeout_ms)
+    deadline_var.set(deadline)
+    set_priority(request, priority, "interactive")
+    selected = analysis_fields(analysis, fields)
+    # The slot is held for the whole stream and released once the response is over
+    await _shed(request, admission.acquire(deadline.remaining()))
+    return AdmittedStreamingResponse(
+        _stream_scrape(url, bypass_cache, selected),
+        admission,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+class BatchScrapeRequest(BaseModel):
+    urls: list[str]
+    concurrency: int | None = None
+    bypass_cache: bool = False
+    analysis: Literal["none", "lite", "full"] = "full"
+    fields: list[str] | None = None
+    priority: str | None = None
+    # Deadline per URL, counted from when its turn comes
+    timeout_ms: int | None = None
+
+
+async def _scrape_batch_item(
+    index: int, url: str, semaphore: asyncio.Semaphore, bypass_cache: bool, fields: tuple, timeout_ms: int | None
+):
+    """Runs one batch entry, turning failures into an inline error record."""
+    async with semaphore:
+        deadline_var.set(Deadline.from_timeout_ms(timeout_ms))
+        try:
+            result = await scrape_playstore_app_data(url, bypass_cache, fields)
+        except HTTPException as e:
+            return {"index": index, "url": url, "error": e.detail, "status_code": e.status_code}
+        except Exception as e:
+            return {"index": index, "url": url, "error": str(e), "status_code": 500}
+    if "error" in result:
+        return {"index": index, "url": url, "error": result["error"], "status_code": 502}
+    return {"index": index, "url": url, "result": result}
+
+
+async def _stream_batch(
+    urls: list[str], concurrency: int, bypass_cache: bool, fields: tuple, timeout_ms: int | None
+):
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = [
+        asyncio.create_task(_scrape_batch_item(i, url, semaphore, bypass_cache, fields, timeout_ms))
+        for i, url in enumerate(urls)
+    ]
+    try:
+        # Emit each line as soon as its item finishes, in completion order
+        for next_done in asyncio.as_completed(tasks):
+            yield json.dumps(await next_done) + "\n"
+    finally:
+        # Client went away (or we finished): don't leave scrapes running
+        for task in tasks:
+            task.cancel()
+
+
+@app.post("/scrape/batch")
+async def scrape_playstore_batch(request: Request, batch: BatchScrapeRequest):
+    set_priority(request, batch.priority, "bulk")
+    if not batch.urls:
+        raise HTTPException(status_code=422, detail="urls must not be empty")
+    if len(batch.urls) > BATCH_MAX_URLS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_URLS} urls per batch")
+    concurrency = min(max(batch.concurrency or BATCH_CONCURRENCY, 1), BATCH_MAX_CONCURRENCY)
+    fields = analysis_fields(batch.analysis, batch.fields)
+    return StreamingResponse(
+        _stream_batch(batch.urls, concurrency, batch.bypass_cache, fields, batch.timeout_ms),
+        media_type="application/x-ndjson",
+    )
+
+
+async def _run_job(job: Job) -> dict:
+    priority_var.set(job.priority)
+    try:
+        fields = FULL_ANALYSIS if job.analysis_fields is None else job.analysis_fields
+        result = await scrape_playstore_app_data(job.url, job.bypass_cache, fields)
+    except HTTPException as e:
+        raise ScrapeError(e.detail)
+    if "error" in result:
+        raise ScrapeError(result["error"])
+    return result
+
+
+job_manager = JobManager(_run_job)
+
+
+class JobRequest(BaseModel):
+    url: str
+    bypass_cache: bool = False
+    # Validated up front: a malformed URL would otherwise only fail once the job is done
+    callback_url: AnyHttpUrl | None = None
+    analysis: Literal["none", "lite", "full"] = "full"
+    fields: list[str] | None = None
+    priority: str | None = None
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: Request, job_request: JobRequest):
+    fields = analysis_fields(job_request.analysis, job_request.fields)
+    lane = set_priority(request, job_request.priority, "bulk")
+    try:
+        job = job_manager.submit(
+            Job(
+                job_request.url,
+                job_request.bypass_cache,
+                str(job_request.callback_url) if job_request.callback_url else None,
+                fields,
+                priority=lane,
+            )
+        )
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"}
 
 
- 
\ No newline at end of file
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
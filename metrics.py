@@ -0,0 +1,280 @@
+"""Prometheus text-format metrics and per-request Server-Timing.
+
+A deliberately small in-house implementation (counters, gauges, histograms
+with labels, plus collector callbacks evaluated at scrape time) so the app
+does not need prometheus_client. Metric updates are thread-safe because page
+parsing and the SQLite analysis cache still run in the threadpool.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterable
+
+from starlette.datastructures import MutableHeaders
+from starlette.routing import Match
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values: dict[tuple, object] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(value)}" for key, value in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = STAGE_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+# A collector returns (name, kind, help, [(labels, value), ...]) tuples when scraped
+Collector = Callable[[], Iterable[tuple[str, str, str, list[tuple[dict, float]]]]]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+        self._collectors: list[Collector] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Collector):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, kind, help, samples in collector():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_DURATION = registry.register(Histogram(
+    "aso_stage_duration_seconds", "Time spent in each scrape pipeline stage.", ("stage",)
+))
+STAGE_ERRORS = registry.register(Counter(
+    "aso_stage_errors_total", "Failures per scrape pipeline stage.", ("stage",)
+))
+HTTP_IN_FLIGHT = registry.register(Gauge(
+    "aso_http_requests_in_flight", "HTTP requests currently being handled.", ("path",)
+))
+HTTP_REQUESTS = registry.register(Counter(
+    "aso_http_requests_total", "HTTP requests handled.", ("path", "method", "status")
+))
+HTTP_DURATION = registry.register(Histogram(
+    "aso_http_request_duration_seconds", "HTTP request latency up to the first response byte.", ("path",)
+))
+OPENAI_TOKENS = registry.register(Counter(
+    "aso_openai_tokens_total", "OpenAI token usage by kind (prompt, completion, cached).", ("kind",)
+))
+OPENAI_QUEUE_WAIT = registry.register(Histogram(
+    "aso_openai_queue_wait_seconds", "Time OpenAI calls waited for a concurrency / rate-limit slot.", ("lane",)
+))
+OPENAI_RATE_LIMITED = registry.register(Counter(
+    "aso_openai_rate_limited_total", "OpenAI calls answered with 429 and re-queued."
+))
+HEDGE_REQUESTS = registry.register(Counter(
+    "aso_hedged_requests_total", "Duplicate requests sent for calls slower than the stage's p95.", ("stage",)
+))
+HEDGE_WINS = registry.register(Counter(
+    "aso_hedge_wins_total", "Hedged requests that finished before the original.", ("stage",)
+))
+PROMPT_DESCRIPTION_TOKENS = registry.register(Counter(
+    "aso_prompt_description_tokens_total", "Estimated description tokens before and after compaction.", ("kind",)
+))
+
+# Stage timings of the request being handled, for the Server-Timing header
+_request_timings: ContextVar[dict | None] = ContextVar("request_timings", default=None)
+
+
+def record_stage(stage: str, seconds: float):
+    STAGE_DURATION.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def count_stage_error(stage: str):
+    STAGE_ERRORS.inc(stage=stage)
+
+
+@contextmanager
+def observe_stage(stage: str):
+    """Times the enclosed block as `stage`, counting an error if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        count_stage_error(stage)
+        raise
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def record_token_usage(usage):
+    """Adds an OpenAI `usage` object to the token counters."""
+    if usage is None:
+        return
+    OPENAI_TOKENS.inc(usage.prompt_tokens or 0, kind="prompt")
+    OPENAI_TOKENS.inc(usage.completion_tokens or 0, kind="completion")
+    details = getattr(usage, "prompt_tokens_details", None)
+    OPENAI_TOKENS.inc(getattr(details, "cached_tokens", 0) or 0, kind="cached")
+
+
+def token_usage() -> dict:
+    """OpenAI token totals so far, with the share of prompt tokens served from the prompt cache."""
+    with OPENAI_TOKENS._lock:
+        totals = {key[0]: value for key, value in OPENAI_TOKENS._values.items()}
+    prompt = totals.get("prompt", 0)
+    cached = totals.get("cached", 0)
+    return {
+        "prompt_tokens": prompt,
+        "completion_tokens": totals.get("completion", 0),
+        "cached_tokens": cached,
+        "prompt_cache_ratio": cached / prompt if prompt else 0.0,
+    }
+
+
+def server_timing(timings: dict, total: float) -> str:
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def _route_path(scope) -> str:
+    # Label by route template, not raw path, to keep label cardinality bounded
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware tracking request counts/latency and adding Server-Timing."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = _route_path(scope)
+        timings: dict = {}
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        status = "500"
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+                elapsed = time.perf_counter() - start
+                HTTP_DURATION.observe(elapsed, path=path)
+                message["headers"] = list(message.get("headers", []))
+                MutableHeaders(scope=message).append("Server-Timing", server_timing(timings, elapsed))
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(path=path)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            HTTP_IN_FLIGHT.dec(path=path)
+            HTTP_REQUESTS.inc(path=path, method=scope["method"], status=status)
+            _request_timings.reset(token)
@@ -0,0 +1,201 @@
+"""Prompt construction for the gpt-4o ASO analysis.
+
+The instructions live in a static system message that is byte-identical
+across requests, so OpenAI's automatic prompt-prefix caching can reuse it.
+The per-app part is a compact canonical JSON user message placed after it,
+with the listing description compacted to a token budget first.
+"""
+import json
+import os
+import re
+import unicodedata
+from functools import lru_cache
+
+from metrics import PROMPT_DESCRIPTION_TOKENS
+
+# Bump whenever the prompt text changes so cached analyses are not reused
+PROMPT_VERSION = "4"
+
+# Description pre-processing before it is sent to the model
+DESCRIPTION_COMPACTION = os.getenv("PROMPT_DESCRIPTION_COMPACTION", "true").lower() in ("1", "true", "yes")
+# Rough token budget for the description; 0 disables truncation
+DESCRIPTION_TOKEN_BUDGET = int(os.getenv("PROMPT_DESCRIPTION_TOKEN_BUDGET", "512"))
+
+# Output field -> instruction, in the order the model should emit them
+ANALYSIS_FIELDS = {
+    "keywords": "List of target keywords in the app description (minimum 8-10 keywords).",
+    "keyword_suggestions": "List of additional keyword suggestions (minimum 5-10 keywords).",
+    "title": "ASO-optimized relevant title (max 30 characters).",
+    "short_description": "Optimized relevant short description (max 80 characters).",
+    "long_description": "Optimized relevant long description (min 2500 characters and max 3000 characters).",
+    "rank_time_estimate": "Estimated improvement timeframe.",
+    "review_suggestions": "List of review sentence suggestions (at least 5).",
+}
+
+FULL_ANALYSIS = tuple(ANALYSIS_FIELDS)
+# `analysis` query parameter -> output fields; "none" skips the LLM entirely
+ANALYSIS_TIERS = {
+    "none": (),
+    "lite": ("keywords", "keyword_suggestions", "title"),
+    "full": FULL_ANALYSIS,
+}
+
+_LIST_FIELDS = {"keywords", "keyword_suggestions", "review_suggestions"}
+# Rough completion size of each field, for rate-limit budgeting
+_OUTPUT_TOKENS = {
+    "keywords": 60,
+    "keyword_suggestions": 60,
+    "title": 15,
+    "short_description": 30,
+    "long_description": 700,
+    "rank_time_estimate": 20,
+    "review_suggestions": 150,
+}
+
+# Independent field groups for fan-out mode, one completion each; the long
+# description dominates output tokens so it gets a call of its own
+ANALYSIS_SUBTASKS = (
+    ("keywords", "keyword_suggestions", "title", "short_description", "rank_time_estimate"),
+    ("long_description",),
+    ("review_suggestions",),
+)
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+|(?<=[。！？])|\s*\n+\s*")
+# Runs of !?. and runs of 3+ other marks; a doubled mark can be meaningful, as in "C++"
+_REPEATED_PUNCT_RE = re.compile(r"([!?.])\1+|([^\w\s!?.])\2{2,}")
+_SPACE_RE = re.compile(r"[^\S\n]+")
+# Emoji, dingbats, bullets and other symbols carry no information for the analysis
+_DROPPED_CATEGORIES = {"So", "Sk", "Cs", "Co", "Cn", "Cf", "Me"}
+_VARIATION_SELECTORS = {chr(cp) for cp in range(0xFE00, 0xFE10)}
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local estimate of the gpt-4o token count of text.
+
+    ASCII words cost one token plus one per further 8 characters, each
+    punctuation mark one, and other scripts roughly one per character.
+    """
+    return sum(1 + len(piece) // 8 if piece.isascii() else len(piece) for piece in _TOKEN_RE.findall(text))
+
+
+def _strip_symbols(text: str) -> str:
+    return "".join(
+        ch for ch in unicodedata.normalize("NFKC", text)
+        if unicodedata.category(ch) not in _DROPPED_CATEGORIES and ch not in _VARIATION_SELECTORS
+    )
+
+
+def compact_text(text: str, budget: int = 0) -> str:
+    """Normalises, de-duplicates and (with a budget) truncates free text.
+
+    Symbols are dropped, whitespace and repeated punctuation collapsed,
+    repeated sentences kept once, and whole sentences appended until the
+    estimated token budget is reached.
+    """
+    text = _REPEATED_PUNCT_RE.sub(lambda match: match.group()[0], _strip_symbols(text))
+    sentences = []
+    seen = set()
+    for sentence in _SENTENCE_SPLIT_RE.split(_SPACE_RE.sub(" ", text)):
+        sentence = sentence.strip(" -*|:;,•·‣◦")
+        key = re.sub(r"\W+", " ", sentence).strip().casefold()
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        sentences.append(sentence)
+
+    if budget <= 0:
+        return " ".join(sentences)
+    kept = []
+    used = 0
+    for sentence in sentences:
+        cost = estimate_tokens(sentence)
+        if used + cost > budget:
+            if not kept:
+                # A single oversized sentence is cut at a word boundary
+                words = []
+                for word in sentence.split(" "):
+                    used += estimate_tokens(word)
+                    if used > budget:
+                        break
+                    words.append(word)
+                kept.append(" ".join(words))
+            break
+        kept.append(sentence)
+        used += cost
+    return " ".join(kept)
+
+
+def compact_app_data(app_data: dict) -> dict:
+    """app_data with the description compacted to the token budget."""
+    description = app_data.get("Description")
+    if not DESCRIPTION_COMPACTION or not isinstance(description, str) or not description:
+        return app_data
+    compacted = compact_text(description, DESCRIPTION_TOKEN_BUDGET)
+    PROMPT_DESCRIPTION_TOKENS.inc(estimate_tokens(description), kind="original")
+    PROMPT_DESCRIPTION_TOKENS.inc(estimate_tokens(compacted), kind="compacted")
+    return {**app_data, "Description": compacted}
+
+
+@lru_cache(maxsize=None)
+def build_system_prompt(fields: tuple = FULL_ANALYSIS) -> str:
+    """Static instruction block for the given output fields."""
+    field_lines = "\n".join(f"- `{name}`: {ANALYSIS_FIELDS[name]}" for name in fields)
+    example = json.dumps({name: [] if name in _LIST_FIELDS else "" for name in fields})
+    return (
+        "Act as a Google App Store Optimization (ASO) expert. The user message is the scraped "
+        "Google Play listing of one app as a JSON object. Analyze it and respond with an "
+        "optimized ASO analysis.\n\n"
+        "Output requirements:\n"
+        "- Respond with a single valid JSON object only: no markdown, no code fences, no extra text.\n"
+        "- The JSON object must contain exactly these fields:\n"
+        f"{field_lines}\n\n"
+        f"JSON shape: {example}"
+    )
+
+
+def resolve_analysis_fields(analysis: str = "full", fields: str | list[str] | None = None) -> tuple:
+    """Output fields for an analysis tier, or for an explicit field selection.
+
+    `fields` (comma-separated or a list) takes precedence over the tier. The
+    result is in ANALYSIS_FIELDS order so equal selections share cache keys.
+    Raises ValueError for an unknown tier or field name, or an explicit
+    selection that names no field (analysis="none" is how to skip it).
+    """
+    if fields is not None:
+        names = [name.strip() for name in (fields.split(",") if isinstance(fields, str) else fields)]
+        unknown = sorted(set(names) - set(ANALYSIS_FIELDS) - {""})
+        if unknown:
+            raise ValueError(f"Unknown analysis fields: {', '.join(unknown)}")
+        selected = tuple(name for name in ANALYSIS_FIELDS if name in names)
+        if not selected:
+            raise ValueError("No analysis fields selected; use analysis=none to skip the analysis")
+        return selected
+    if analysis not in ANALYSIS_TIERS:
+        raise ValueError(f"Unknown analysis tier: {analysis}")
+    return ANALYSIS_TIERS[analysis]
+
+
+def analysis_subtasks(fields: tuple = FULL_ANALYSIS) -> list[tuple]:
+    """ANALYSIS_SUBTASKS narrowed to the requested fields, dropping empty groups."""
+    groups = [tuple(name for name in group if name in fields) for group in ANALYSIS_SUBTASKS]
+    return [group for group in groups if group]
+
+
+def app_data_payload(app_data: dict) -> str:
+    """Compact canonical JSON of app_data (sorted keys, no padding)."""
+    return json.dumps(app_data, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def build_analysis_messages(app_data: dict, fields: tuple = FULL_ANALYSIS) -> list[dict]:
+    """Chat messages asking gpt-4o for the ASO analysis of app_data."""
+    return [
+        {"role": "system", "content": build_system_prompt(fields)},
+        {"role": "user", "content": app_data_payload(compact_app_data(app_data))},
+    ]
+
+
+def estimate_request_tokens(messages: list[dict], fields: tuple = FULL_ANALYSIS) -> int:
+    """Estimated prompt plus completion tokens of an analysis call."""
+    prompt = sum(estimate_tokens(message["content"]) + 4 for message in messages)
+    return prompt + sum(_OUTPUT_TOKENS.get(name, 50) for name in fields)
@@ -0,0 +1,361 @@
+"""Concurrency and rate-limit aware admission for OpenAI calls.
+
+Every completion waits for a RateLimitScheduler slot before it is sent. A
+slot is granted once fewer than `max_concurrency` calls are in flight and
+the request and token budgets of the current window cover it. Waiting calls
+sit in per-priority lanes (interactive, bulk) served FIFO within a lane and
+by weighted fair sharing (stride scheduling) across lanes.
+The budgets start from the configured limits and are corrected from the
+`x-ratelimit-*` headers of each response; a 429 pauses admission until the
+advertised reset and the call is queued again instead of failing.
+"""
+import asyncio
+import os
+import re
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from openai import RateLimitError
+
+from metrics import OPENAI_QUEUE_WAIT, OPENAI_RATE_LIMITED, record_stage
+
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+# Per-minute budgets assumed until the first response headers arrive; 0 means unknown
+OPENAI_RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", "0"))
+OPENAI_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", "0"))
+# How many times a 429 is re-queued before it is surfaced
+OPENAI_RATE_LIMIT_RETRIES = int(os.getenv("OPENAI_RATE_LIMIT_RETRIES", "5"))
+
+
+def _lane_setting(value: str) -> dict[str, int]:
+    pairs = (item.split("=", 1) for item in value.split(",") if "=" in item)
+    return {lane.strip(): int(amount) for lane, amount in pairs}
+
+
+# Priority lanes: share of admissions while both are busy, and queue caps
+LANE_WEIGHTS = _lane_setting(os.getenv("OPENAI_LANE_WEIGHTS", "interactive=4,bulk=1"))
+LANE_MAX_QUEUE = _lane_setting(os.getenv("OPENAI_LANE_MAX_QUEUE", "interactive=200,bulk=5000"))
+DEFAULT_LANE = "interactive"
+
+# Lane of the request being handled; set by the endpoints, inherited by their tasks
+priority_var: ContextVar[str] = ContextVar("priority", default=DEFAULT_LANE)
+# Shared (single-flight) work the current call belongs to, so that a
+# higher-priority caller joining it can promote its calls with promote()
+flight_var: ContextVar[str | None] = ContextVar("flight", default=None)
+
+WINDOW_SECONDS = 60.0
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+def parse_reset(value: str | None) -> float | None:
+    """Seconds from an OpenAI reset header such as "1s", "6m0s" or "20ms"."""
+    if not value:
+        return None
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+class _Budget:
+    """Remaining requests or tokens in the current rate-limit window."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.remaining = limit
+        self.reset_at = time.monotonic() + WINDOW_SECONDS
+        self.paused_until = 0.0
+
+    def refresh(self, now: float):
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + WINDOW_SECONDS
+
+    def delay(self, amount: int, now: float) -> float:
+        """Seconds until `amount` fits, 0 if it fits now."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        if not self.limit:
+            return 0.0
+        self.refresh(now)
+        # A call larger than the whole window budget is let through on a fresh window
+        if self.remaining >= min(amount, self.limit):
+            return 0.0
+        return max(self.reset_at - now, 0.001)
+
+    def spend(self, amount: int):
+        if self.limit:
+            self.remaining -= amount
+
+    def observe(self, limit: str | None, remaining: str | None, reset: str | None, now: float):
+        if limit and limit.isdigit():
+            self.limit = int(limit)
+        if remaining and remaining.isdigit():
+            self.remaining = int(remaining)
+        seconds = parse_reset(reset)
+        if seconds is not None:
+            self.reset_at = now + seconds
+
+    def pause(self, until: float):
+        self.paused_until = max(self.paused_until, until)
+
+
+class LaneQueueFull(Exception):
+    pass
+
+
+class RateLimitScheduler:
+    """Admission of OpenAI calls under concurrency, RPM and TPM budgets, by priority lane."""
+
+    def __init__(
+        self,
+        max_concurrency: int = OPENAI_MAX_CONCURRENCY,
+        rpm_limit: int = OPENAI_RPM_LIMIT,
+        tpm_limit: int = OPENAI_TPM_LIMIT,
+        lane_weights: dict[str, int] = LANE_WEIGHTS,
+        lane_max_queue: dict[str, int] = LANE_MAX_QUEUE,
+    ):
+        self.max_concurrency = max_concurrency
+        self.lane_weights = lane_weights
+        self.lane_max_queue = lane_max_queue
+        self.requests = _Budget(rpm_limit)
+        self.tokens = _Budget(tpm_limit)
+        self.in_flight = 0
+        self.admitted = 0
+        self.rate_limited = 0
+        self.wait_seconds_total = 0.0
+        self.lane_admitted = {lane: 0 for lane in lane_weights}
+        self.lane_rejected = {lane: 0 for lane in lane_weights}
+        self.promoted = 0
+        # Waiters are (future, tokens, flight)
+        self._waiters: dict[str, deque[tuple[asyncio.Future, int, str | None]]] = {
+            lane: deque() for lane in lane_weights
+        }
+        # Lanes flights were promoted to by higher-priority callers joining them
+        self._flight_lanes: dict[str, str] = {}
+        # Stride scheduling: each admission advances the lane's pass by 1/weight
+        # and the busy lane with the lowest pass goes next
+        self._pass = {lane: 0.0 for lane in lane_weights}
+        self._virtual_time = 0.0
+        self._timer: asyncio.TimerHandle | None = None
+
+    @property
+    def queued(self) -> int:
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def lane(self, name: str | None) -> str:
+        """A known lane name, falling back to the default lane."""
+        if name in self._waiters:
+            return name
+        return DEFAULT_LANE if DEFAULT_LANE in self._waiters else next(iter(self._waiters))
+
+    def _next_lane(self) -> str | None:
+        busy = [lane for lane, waiters in self._waiters.items() if waiters]
+        return min(busy, key=self._pass.__getitem__) if busy else None
+
+    def _dispatch(self):
+        self._timer = None
+        while self.in_flight < self.max_concurrency:
+            lane = self._next_lane()
+            if lane is None:
+                return
+            future, tokens, _ = self._waiters[lane][0]
+            now = time.monotonic()
+            delay = max(self.requests.delay(1, now), self.tokens.delay(tokens, now))
+            if delay:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            self._waiters[lane].popleft()
+            self._virtual_time = self._pass[lane]
+            self._pass[lane] += 1 / max(self.lane_weights[lane], 1)
+            self.requests.spend(1)
+            self.tokens.spend(tokens)
+            self.in_flight += 1
+            self.admitted += 1
+            self.lane_admitted[lane] += 1
+            future.set_result(None)
+
+    def _wake(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._dispatch()
+
+    async def acquire(self, tokens: int, lane: str | None = None):
+        """Waits until the call may be sent; pair with release().
+
+        Uses the request's priority lane unless one is given, or the lane its
+        flight was promoted to if that is higher. Raises LaneQueueFull when
+        that lane already has its maximum of waiters.
+        """
+        flight = flight_var.get()
+        lane = self.lane(lane or priority_var.get())
+        promoted = self._flight_lanes.get(flight)
+        if promoted is not None and self.lane_weights[promoted] > self.lane_weights[lane]:
+            lane = promoted
+        waiters = self._waiters[lane]
+        if len(waiters) >= self.lane_max_queue.get(lane, 0) > 0:
+            self.lane_rejected[lane] += 1
+            raise LaneQueueFull(f"Too many queued {lane} analyses, try again later")
+        future = asyncio.get_running_loop().create_future()
+        entry = (future, tokens, flight)
+        self._enqueue(lane, entry)
+        start = time.perf_counter()
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted in the same tick as the cancellation: hand the slot back
+                self.release()
+            else:
+                # Not necessarily in the lane it joined, if it was promoted since
+                for waiters in self._waiters.values():
+                    if entry in waiters:
+                        waiters.remove(entry)
+                        break
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            self.wait_seconds_total += waited
+            OPENAI_QUEUE_WAIT.observe(waited, lane=lane)
+            record_stage("llm_queue", waited)
+
+    def _enqueue(self, lane: str, entry: tuple):
+        waiters = self._waiters[lane]
+        if not waiters:
+            # A lane that was idle starts at the current virtual time, not with banked credit
+            self._pass[lane] = max(self._pass[lane], self._virtual_time)
+        waiters.append(entry)
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def promote(self, flight: str, lane: str | None = None):
+        """Moves the calls of `flight` up to `lane` (default: the request's lane).
+
+        For a caller joining shared work started from a lower-priority lane:
+        queued calls move to the back of `lane` and later calls are queued
+        there too, until forget(flight). Never moves calls down.
+        """
+        lane = self.lane(lane or priority_var.get())
+        current = self._flight_lanes.get(flight)
+        if current is not None and self.lane_weights[current] >= self.lane_weights[lane]:
+            return
+        self._flight_lanes[flight] = lane
+        moved = False
+        for name, waiters in self._waiters.items():
+            if self.lane_weights[name] >= self.lane_weights[lane]:
+                continue
+            for entry in [entry for entry in waiters if entry[2] == flight]:
+                waiters.remove(entry)
+                self._enqueue(lane, entry)
+                self.promoted += 1
+                moved = True
+        if moved:
+            self._wake()
+
+    def forget(self, flight: str):
+        """Drops the promotion of a finished flight."""
+        self._flight_lanes.pop(flight, None)
+
+    @asynccontextmanager
+    async def slot(self, tokens: int):
+        await self.acquire(tokens)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def observe_headers(self, headers):
+        """Corrects the budgets from a response's x-ratelimit-* headers."""
+        now = time.monotonic()
+        self.requests.observe(
+            headers.get("x-ratelimit-limit-requests"),
+            headers.get("x-ratelimit-remaining-requests"),
+            headers.get("x-ratelimit-reset-requests"),
+            now,
+        )
+        self.tokens.observe(
+            headers.get("x-ratelimit-limit-tokens"),
+            headers.get("x-ratelimit-remaining-tokens"),
+            headers.get("x-ratelimit-reset-tokens"),
+            now,
+        )
+
+    def observe_rate_limited(self, headers):
+        """Stops admitting until the reset advertised by a 429."""
+        self.rate_limited += 1
+        OPENAI_RATE_LIMITED.inc()
+        retry_after = parse_reset(headers.get("retry-after"))
+        if retry_after is None:
+            retry_after = max(
+                parse_reset(headers.get("x-ratelimit-reset-requests")) or 0,
+                parse_reset(headers.get("x-ratelimit-reset-tokens")) or 0,
+            ) or 1.0
+        until = time.monotonic() + retry_after
+        self.requests.pause(until)
+        self.tokens.pause(until)
+
+    @asynccontextmanager
+    async def open(self, tokens: int, request):
+        """Runs `request` (a coroutine factory returning a raw API response) under a slot.
+
+        Yields the parsed response and holds the slot until the block exits,
+        so streamed responses count as in flight while they are consumed.
+        429s are re-queued up to OPENAI_RATE_LIMIT_RETRIES times.
+        """
+        for attempt in range(OPENAI_RATE_LIMIT_RETRIES + 1):
+            await self.acquire(tokens)
+            try:
+                raw = await request()
+            except RateLimitError as e:
+                # Pause before releasing, or the freed slot goes straight to the next call
+                self.observe_rate_limited(e.response.headers)
+                self.release()
+                if attempt == OPENAI_RATE_LIMIT_RETRIES:
+                    raise
+                continue
+            except BaseException:
+                self.release()
+                raise
+            try:
+                self.observe_headers(raw.headers)
+                yield raw.parse()
+            finally:
+                self.release()
+            return
+
+    async def call(self, tokens: int, request):
+        """open() for non-streamed calls: returns the parsed response."""
+        async with self.open(tokens, request) as response:
+            return response
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rate_limited": self.rate_limited,
+            "promoted": self.promoted,
+            "wait_seconds_total": round(self.wait_seconds_total, 3),
+            "lanes": {
+                lane: {
+                    "weight": self.lane_weights[lane],
+                    "queued": len(waiters),
+                    "max_queue": self.lane_max_queue.get(lane, 0),
+                    "admitted": self.lane_admitted[lane],
+                    "rejected": self.lane_rejected[lane],
+                }
+                for lane, waiters in self._waiters.items()
+            },
+            "requests": {"limit": self.requests.limit, "remaining": self.requests.remaining},
+            "tokens": {"limit": self.tokens.limit, "remaining": self.tokens.remaining},
+        }
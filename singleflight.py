@@ -0,0 +1,92 @@
+"""Coalesces concurrent calls for the same key into one in-flight task."""
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """The first caller for a key starts the work; later callers await the same task.
+
+    Every waiter gets the same result or exception. The shared task is shielded,
+    so one waiter being cancelled (e.g. a disconnected client) does not cancel
+    the work for the others. With `cancel_abandoned`, the work is cancelled
+    once every waiter has gone, so nobody pays for a result nobody receives.
+    A waiter that stops waiting because its `timeout` ran out does not count
+    as abandoning the work: it keeps running so a later call can pick it up.
+    `on_done(key)` is called once the task for key has finished, however it
+    ended, e.g. to drop per-flight state kept elsewhere.
+    """
+
+    def __init__(self, cancel_abandoned: bool = False, on_done: Callable[[Hashable], None] | None = None):
+        self.cancel_abandoned = cancel_abandoned
+        self.on_done = on_done
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self._waiters: dict[Hashable, int] = {}
+        self.started = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]], timeout: float | None = None) -> T:
+        """Result of the shared task for key; raises asyncio.TimeoutError after `timeout` seconds."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._launch(key, fn)
+        else:
+            self.coalesced += 1
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        timed_out = False
+        try:
+            if timeout is None:
+                return await asyncio.shield(task)
+            # asyncio.wait leaves the task running when the timeout expires
+            done, _ = await asyncio.wait({task}, timeout=timeout)
+            if not done:
+                timed_out = True
+                raise asyncio.TimeoutError()
+            return task.result()
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+                if self.cancel_abandoned and not timed_out and not task.done():
+                    self.abandoned += 1
+                    task.cancel()
+
+    def start(self, key: Hashable, fn: Callable[[], Awaitable]) -> bool:
+        """Runs fn() in the background as the task for key; False if one is already in flight.
+
+        Later do() calls for key join it, but nobody waiting on it does not cancel it.
+        """
+        if key in self._inflight:
+            return False
+        self._launch(key, fn)
+        return True
+
+    def _launch(self, key: Hashable, fn: Callable[[], Awaitable]) -> asyncio.Task:
+        task = asyncio.ensure_future(fn())
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._finish(key, t))
+        self.started += 1
+        return task
+
+    def running(self, key: Hashable) -> bool:
+        """Whether a task for key is in flight, i.e. do() would join it."""
+        return key in self._inflight
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            if self.on_done is not None:
+                self.on_done(key)
+        # Mark the exception as retrieved in case every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "started": self.started,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned,
+        }
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The app modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# main builds its OpenAI client at import time
+os.environ.setdefault("OPENAI_API_KEY", "test")
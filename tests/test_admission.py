@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmittedStreamingResponse, Overloaded
+
+
+async def _disconnect_before_first_chunk(response):
+    """Sends `response` to a client that is gone before the body starts."""
+    started = False
+
+    async def body():
+        nonlocal started
+        started = True
+        yield "event: done\n\n"
+
+    response.body_iterator = body()
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        # Yield so the disconnect listener wins the race with the body
+        await asyncio.sleep(0.01)
+
+    scope = {"type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}}
+    await response(scope, receive, send)
+    return started
+
+
+@pytest.mark.asyncio
+async def test_stream_releases_slot_when_client_disconnects_before_first_chunk():
+    admission = AdmissionController(max_in_flight=1, max_queued=0)
+    for _ in range(3):
+        await admission.acquire()
+        response = AdmittedStreamingResponse(iter(()), admission, media_type="text/event-stream")
+        assert not await _disconnect_before_first_chunk(response)
+        assert admission.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_stream_releases_slot_when_body_raises():
+    admission = AdmissionController(max_in_flight=1, max_queued=0)
+    await admission.acquire()
+
+    async def body():
+        yield "event: app_data\n\n"
+        raise RuntimeError("boom")
+
+    async def receive():
+        await asyncio.sleep(1)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        pass
+
+    response = AdmittedStreamingResponse(body(), admission)
+    with pytest.raises(RuntimeError):
+        await response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send)
+    assert admission.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_full_queue_is_rejected_straight_away():
+    admission = AdmissionController(max_in_flight=1, max_queued=1)
+    await admission.acquire()
+    queued = asyncio.ensure_future(admission.acquire())
+    await asyncio.sleep(0)
+    with pytest.raises(Overloaded):
+        await admission.acquire()
+    assert admission.rejected == 1
+    admission.release()
+    await queued
+    assert admission.in_flight == 1
+
+
+@pytest.mark.asyncio
+async def test_queued_request_times_out_after_the_shorter_timeout():
+    admission = AdmissionController(max_in_flight=1, max_queued=1, queue_timeout=10)
+    await admission.acquire()
+    with pytest.raises(Overloaded) as excinfo:
+        await asyncio.wait_for(admission.acquire(timeout=0.01), 1)
+    assert excinfo.value.retry_after >= 1
+    assert admission.timed_out == 1
+    assert admission.queued == 0
+    assert admission.in_flight == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_while_queued_leaves_the_queue():
+    admission = AdmissionController(max_in_flight=1, max_queued=1)
+    await admission.acquire()
+    queued = asyncio.ensure_future(admission.acquire())
+    await asyncio.sleep(0)
+    queued.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await queued
+    assert admission.abandoned == 1
+    assert admission.queued == 0
+    admission.release()
+    assert admission.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_slot_handed_over_to_a_cancelled_waiter_is_passed_on():
+    admission = AdmissionController(max_in_flight=1, max_queued=2, queue_timeout=1)
+    await admission.acquire()
+    first = asyncio.ensure_future(admission.acquire())
+    second = asyncio.ensure_future(admission.acquire())
+    await asyncio.sleep(0)
+    # The slot goes to `first` in the same tick as its cancellation
+    admission.release()
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    await second
+    assert admission.in_flight == 1
+    assert admission.queued == 0
+    admission.release()
+    assert admission.in_flight == 0
@@ -0,0 +1,39 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+
+import main
+from hedge import HEDGE_MIN_SAMPLES, Hedger
+
+PAGE = b"<html><head><title>Example</title></head><body></body></html>"
+
+
+@pytest.mark.asyncio
+async def test_hedged_incremental_fetch_records_the_stage_once(monkeypatch):
+    attempts = 0
+    recorded = []
+
+    @asynccontextmanager
+    async def stream_playstore_page(url, headers=None):
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            # The primary stalls, so the hedge wins and the primary is cancelled
+            await asyncio.sleep(10)
+        yield httpx.Response(200, content=PAGE)
+
+    hedger = Hedger("fetch", enabled=True, max_ratio=1.0)
+    hedger._samples[""] = deque([0.01] * HEDGE_MIN_SAMPLES)
+    monkeypatch.setattr(main, "stream_playstore_page", stream_playstore_page)
+    monkeypatch.setattr(main, "fetch_hedger", hedger)
+    monkeypatch.setattr(main, "record_stage", lambda stage, seconds: recorded.append(stage))
+
+    response, app_data = await main._fetch_incremental("https://play.google.com/store/apps/details?id=a", None)
+    # Let the cancelled primary unwind before counting
+    await asyncio.sleep(0.01)
+    assert app_data["Name"] == "Example"
+    assert hedger.hedge_wins == 1
+    assert recorded.count("fetch") == 1
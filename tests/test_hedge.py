@@ -0,0 +1,72 @@
+import asyncio
+from collections import deque
+
+import pytest
+
+from hedge import HEDGE_MIN_SAMPLES, Hedger
+
+
+def _hedger(**kwargs) -> Hedger:
+    hedger = Hedger("test", enabled=True, **kwargs)
+    hedger._samples[""] = deque([0.01] * HEDGE_MIN_SAMPLES)
+    return hedger
+
+
+@pytest.mark.asyncio
+async def test_slow_call_is_hedged_and_the_loser_cancelled():
+    hedger = _hedger(max_ratio=1.0)
+    calls = []
+
+    async def fn():
+        calls.append(asyncio.current_task())
+        if len(calls) == 1:
+            await asyncio.sleep(10)
+            return "primary"
+        return "hedge"
+
+    assert await hedger.run(fn) == "hedge"
+    await asyncio.sleep(0)
+    assert calls[0].cancelled()
+    assert (hedger.hedged, hedger.hedge_wins) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_failed_call_does_not_win_while_the_other_runs():
+    hedger = _hedger(max_ratio=1.0)
+    calls = 0
+
+    async def fn():
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            await asyncio.sleep(0.05)
+            raise RuntimeError("primary failed")
+        await asyncio.sleep(0.1)
+        return "hedge"
+
+    assert await hedger.run(fn) == "hedge"
+
+
+@pytest.mark.asyncio
+async def test_hedges_are_capped_by_the_credit():
+    hedger = _hedger(max_ratio=0.0)
+
+    async def fn():
+        await asyncio.sleep(0.03)
+        return "primary"
+
+    assert await hedger.run(fn) == "primary"
+    assert (hedger.hedged, hedger.capped) == (0, 1)
+
+
+@pytest.mark.asyncio
+async def test_no_hedge_before_enough_samples():
+    hedger = Hedger("test", enabled=True, max_ratio=1.0)
+
+    async def fn():
+        await asyncio.sleep(0.01)
+        return "primary"
+
+    assert await hedger.run(fn) == "primary"
+    assert hedger.hedged == 0
+    assert hedger.threshold() is None
@@ -0,0 +1,26 @@
+import asyncio
+
+import pytest
+
+from jobs import Job, JobManager
+
+
+@pytest.mark.asyncio
+async def test_bad_callback_url_does_not_kill_the_worker():
+    async def runner(job):
+        return {"ok": job.url}
+
+    manager = JobManager(runner, workers=1)
+    manager.start()
+    try:
+        bad = manager.submit(Job("https://play.google.com/store/apps/details?id=a", callback_url="http://[::1"))
+        good = manager.submit(Job("https://play.google.com/store/apps/details?id=b"))
+        for _ in range(100):
+            if good.status == "succeeded":
+                break
+            await asyncio.sleep(0.01)
+        assert bad.status == "succeeded"
+        assert bad.callback_status.startswith("failed")
+        assert good.status == "succeeded"
+    finally:
+        await manager.stop()
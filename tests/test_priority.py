@@ -0,0 +1,23 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+URL = "https://play.google.com/store/apps/details?id=com.example"
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize("path", ["/scrape", "/scrape/stream"])
+def test_unknown_priority_lane_is_rejected(client, path):
+    response = client.get(path, params={"url": URL, "priority": "Bulk"})
+    assert response.status_code == 422
+    assert "interactive, bulk" in response.json()["detail"]
+
+
+def test_unknown_priority_lane_is_rejected_for_jobs_and_batches(client):
+    assert client.post("/jobs", json={"url": URL, "priority": "urgent"}).status_code == 422
+    assert client.post("/scrape/batch", json={"urls": [URL], "priority": "urgent"}).status_code == 422
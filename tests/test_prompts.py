@@ -0,0 +1,5 @@
+from prompts import compact_text
+
+
+def test_compaction_keeps_doubled_marks():
+    assert compact_text("Learn C++ and C# fast!!! Really??? Yes.... A --- B") == "Learn C++ and C# fast! Really? Yes. A - B"
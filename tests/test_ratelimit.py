@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from ratelimit import LaneQueueFull, RateLimitScheduler, flight_var, parse_reset, priority_var
+
+
+def _scheduler(**kwargs) -> RateLimitScheduler:
+    settings = {
+        "max_concurrency": 1,
+        "rpm_limit": 0,
+        "tpm_limit": 0,
+        "lane_weights": {"interactive": 4, "bulk": 1},
+        "lane_max_queue": {"interactive": 100, "bulk": 100},
+    }
+    return RateLimitScheduler(**{**settings, **kwargs})
+
+
+async def _queue(scheduler, lane, name, order, flight=None):
+    flight_var.set(flight)
+    await scheduler.acquire(1, lane)
+    order.append(name)
+
+
+async def _drain(scheduler, tasks):
+    """Releases the slot each time a queued call gets it, until all have run."""
+    for _ in tasks:
+        await asyncio.sleep(0)
+        scheduler.release()
+    await asyncio.gather(*tasks)
+
+
+@pytest.mark.parametrize(
+    "value, seconds",
+    [("1s", 1.0), ("6m0s", 360.0), ("20ms", 0.02), ("1h2m", 3720.0), ("2.5", 2.5), ("soon", None), (None, None)],
+)
+def test_parse_reset(value, seconds):
+    assert parse_reset(value) == seconds
+
+
+@pytest.mark.asyncio
+async def test_lanes_are_admitted_by_weight():
+    scheduler = _scheduler()
+    await scheduler.acquire(1)
+    order = []
+    tasks = [asyncio.ensure_future(_queue(scheduler, "bulk", "bulk", order)) for _ in range(10)]
+    tasks += [asyncio.ensure_future(_queue(scheduler, "interactive", "interactive", order)) for _ in range(10)]
+    await asyncio.sleep(0)
+    await _drain(scheduler, tasks)
+    # Four interactive calls for every bulk one while both lanes are busy
+    assert order[:10].count("interactive") == 8
+
+
+@pytest.mark.asyncio
+async def test_full_lane_is_rejected():
+    scheduler = _scheduler(lane_max_queue={"interactive": 100, "bulk": 1})
+    await scheduler.acquire(1)
+    queued = asyncio.ensure_future(scheduler.acquire(1, "bulk"))
+    await asyncio.sleep(0)
+    with pytest.raises(LaneQueueFull):
+        await scheduler.acquire(1, "bulk")
+    assert scheduler.lane_rejected["bulk"] == 1
+    scheduler.release()
+    await queued
+
+
+@pytest.mark.asyncio
+async def test_promoted_flight_jumps_the_bulk_queue():
+    scheduler = _scheduler()
+    await scheduler.acquire(1, "bulk")
+    order = []
+    tasks = [asyncio.ensure_future(_queue(scheduler, "bulk", f"bulk-{i}", order)) for i in range(3)]
+    tasks.append(asyncio.ensure_future(_queue(scheduler, "bulk", "shared", order, flight="k")))
+    await asyncio.sleep(0)
+    priority_var.set("interactive")
+    scheduler.promote("k")
+    assert scheduler.promoted == 1
+    await _drain(scheduler, tasks)
+    assert order[0] == "shared"
+    scheduler.forget("k")
+    assert not scheduler._flight_lanes
+
+
+@pytest.mark.asyncio
+async def test_slot_admitted_to_a_cancelled_call_is_handed_back():
+    scheduler = _scheduler()
+    await scheduler.acquire(1)
+    first = asyncio.ensure_future(scheduler.acquire(1))
+    second = asyncio.ensure_future(scheduler.acquire(1))
+    await asyncio.sleep(0)
+    # The slot goes to `first` in the same tick as its cancellation
+    scheduler.release()
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    await asyncio.wait_for(second, 1)
+    assert scheduler.in_flight == 1
+    assert scheduler.queued == 0
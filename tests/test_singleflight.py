@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_on_done_runs_when_the_flight_finishes():
+    finished = []
+    flights = SingleFlight(on_done=finished.append)
+    release = asyncio.Event()
+
+    async def work():
+        await release.wait()
+        return 1
+
+    first = asyncio.ensure_future(flights.do("k", work))
+    second = asyncio.ensure_future(flights.do("k", work))
+    await asyncio.sleep(0)
+    assert finished == []
+    release.set()
+    assert await asyncio.gather(first, second) == [1, 1]
+    assert finished == ["k"]
+
+
+@pytest.mark.asyncio
+async def test_on_done_runs_for_a_flight_cancelled_before_it_starts():
+    finished = []
+    flights = SingleFlight(cancel_abandoned=True, on_done=finished.append)
+
+    async def work():
+        raise AssertionError("never started")
+
+    waiter = asyncio.ensure_future(flights.do("k", work))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    await asyncio.sleep(0)
+    assert finished == ["k"]
+    assert not flights.running("k")
+
+
+@pytest.mark.asyncio
+async def test_work_is_cancelled_once_every_waiter_has_gone():
+    flights = SingleFlight(cancel_abandoned=True)
+    cancelled = asyncio.Event()
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    waiters = [asyncio.ensure_future(flights.do("k", work)) for _ in range(2)]
+    await asyncio.sleep(0)
+    waiters[0].cancel()
+    await asyncio.sleep(0)
+    assert flights.running("k")
+    waiters[1].cancel()
+    await asyncio.gather(*waiters, return_exceptions=True)
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert flights.abandoned == 1
+    assert not flights.running("k")
+
+
+@pytest.mark.asyncio
+async def test_timed_out_waiter_leaves_the_work_running():
+    flights = SingleFlight(cancel_abandoned=True)
+    release = asyncio.Event()
+
+    async def work():
+        await release.wait()
+        return "done"
+
+    with pytest.raises(asyncio.TimeoutError):
+        await flights.do("k", work, timeout=0.01)
+    assert flights.running("k")
+    assert flights.abandoned == 0
+    later = asyncio.ensure_future(flights.do("k", work))
+    await asyncio.sleep(0)
+    release.set()
+    assert await later == "done"
+    assert (flights.started, flights.coalesced) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_started_work_runs_without_waiters_and_can_be_joined():
+    flights = SingleFlight(cancel_abandoned=True)
+    release = asyncio.Event()
+
+    async def work():
+        await release.wait()
+        return "done"
+
+    assert flights.start("k", work)
+    assert not flights.start("k", work)
+    joined = asyncio.ensure_future(flights.do("k", work))
+    await asyncio.sleep(0)
+    release.set()
+    assert await joined == "done"
+    assert (flights.started, flights.coalesced) == (1, 1)
@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+import pytest
+
+import main
+from cache import AnalysisCache
+from deadline import Deadline, deadline_var
+
+URL = "https://play.google.com/store/apps/details?id=com.example&hl=en"
+APP_DATA = {"Name": "Example", "Description": "An example app"}
+
+
+@pytest.fixture
+def stubbed(monkeypatch, tmp_path):
+    """main with the fetch and the streamed completion replaced by local stand-ins."""
+    finish = asyncio.Event()
+    closed = []
+
+    async def get_app_data(url, bypass_cache=False):
+        return APP_DATA
+
+    async def stream_analysis(app_data, fields):
+        try:
+            yield '{"title": '
+            await finish.wait()
+            yield '"Example"}'
+        finally:
+            closed.append(True)
+
+    monkeypatch.setattr(main, "get_app_data", get_app_data)
+    monkeypatch.setattr(main, "stream_analysis", stream_analysis)
+    monkeypatch.setattr(main, "analysis_cache", AnalysisCache(str(tmp_path / "analysis.sqlite3")))
+    return finish, closed
+
+
+async def _events(fields, events=None):
+    events = [] if events is None else events
+    async for message in main._stream_scrape(URL, False, fields):
+        event, data = message.split("\n")[:2]
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+@pytest.mark.asyncio
+async def test_analysis_keeps_running_after_the_deadline(stubbed):
+    finish, closed = stubbed
+    fields = ("title",)
+    deadline_var.set(Deadline(0.5))
+
+    events = await _events(fields)
+    assert [event for event, _ in events] == ["app_data", "delta", "analysis_pending", "done"]
+    key = main._analysis_key(APP_DATA, fields)
+    assert main.analysis_flights.running(key)
+    assert not closed
+
+    finish.set()
+    for _ in range(100):
+        if not main.analysis_flights.running(key):
+            break
+        await asyncio.sleep(0.01)
+    assert closed
+    assert main.analysis_cache.get(key) == {"title": "Example"}
+
+
+@pytest.mark.asyncio
+async def test_cancelled_stream_closes_the_completion(stubbed):
+    _, closed = stubbed
+    deadline_var.set(None)
+
+    events = []
+    task = asyncio.ensure_future(_events(("title",), events))
+    for _ in range(100):
+        if events and events[-1][0] == "delta":
+            break
+        await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert closed
+    assert not main.analysis_flights.running(main._analysis_key(APP_DATA, ("title",)))